@@ -3,9 +3,13 @@ This example assumes you have connected your Raspberry Pi 4 according to the dia
 """
 
 import board
+import os
+import tempfile
 import time
 
 from photobooth import RPi
+from photobooth.derivatives import DerivativeCache
+from photobooth.receipt import register_template
 
 booth = RPi()
 
@@ -34,11 +38,25 @@ if booth.net_check_www():
     booth.toggle_led(label="net_www", on=True)
 
 # Setup Camera and toggle LED
-camera = booth.add_camera(name="main", model="Canon EOS 1100D")
+# Display, thumbnail and print sized copies of each capture are made in the background
+camera = booth.add_camera(name="main", model="Canon EOS 1100D", derivatives=DerivativeCache())
 booth.toggle_led(label="camera_rdy", on=True)
 
 # Setup Printer and toggle LED
 printer = booth.add_printer(name="receipt", model="PBM-8350U")
+# Printers print from background threads, so buttons stay responsive. With more than one
+# add_printer(), jobs are balanced across them and a jammed or unplugged one is skipped
+spooler = booth.get_printer_pool()
+
+# Compiled to ESC/POS once, only the photo and QR code are filled in per print
+register_template("thanks", [
+    ("image", "{shot}"),
+    ("ln",),
+    ("qr", "{url}", {"size": 10}),  # Could be where the photo was uploaded
+    ("ln",),
+    ("text", "Thank you for using our photobooth! Please visit us at http://website.net"),
+    ("cut",)
+])
 booth.toggle_led(label="print_rdy", on=True)
 
 # Wait for panel test to finish
@@ -49,50 +67,45 @@ print("Booth is online and ready")
 # Booth is ready
 booth.toggle_led(label="shutter_rdy", on=True)
 
-attract = booth.run_as_thread(panel.scroll, start=True, speed=0.01,
-                              text="Press the capture button to begin!  ",)
+# One persistent worker per component, effects and captures are sent to them as commands
+panel_worker = booth.get_worker(panel)
+camera_worker = booth.get_worker(camera)
+
+THUMBNAIL = os.path.join(tempfile.gettempdir(), "photobooth-thumbnail.jpg")
+
+attract = dict(text="Press the capture button to begin!  ", speed=0.01)
+panel_worker.loop("scroll", **attract)
 
 # Run Booth
 while True:
-    time.sleep(0.05)  # if you dont have a short sleep, your CPU will catch fire. /s
+    # Sleeps until a button is pressed, presses are debounced and queued by edge callbacks
+    button = booth.wait_for_button(labels=["capture", "print"])
 
-    if booth.check_sw_input("capture"):
+    if button["label"] == "capture":
         print("Capture button was pressed")
-        attract.stop_immediately()
-        panel.scroll(text="3...")
-        panel.scroll(text="2...")
-        panel.scroll(text="1...")
-        panel.flash(text="Smile! :D")
-        capture = booth.run_as_thread(target=camera.capture, executions=1, start=True)
-        wait = booth.run_as_thread(target=panel.twinkle, start=True, count=20)
-        while capture.is_alive():
-            time.sleep(0.01)
-        wait.stop_immediately()
-        panel.scroll(text="AWESOME!")
-        booth.copy_to_last_shot(camera.last_shot())
-        attract.restart()
+        panel_worker.send("scroll", text="3...")  # Stops the attract loop
+        panel_worker.send("scroll", text="2...")
+        panel_worker.send("scroll", text="1...")
+        panel_worker.send("flash", text="Smile! :D")
+        panel_worker.wait()
+        # Returns as soon as the shutter has fired and the camera's thumbnail is saved
+        shot = camera_worker.send("trigger", thumbnail=THUMBNAIL)
+        panel_worker.loop("twinkle", count=1)
+        last_shot = shot.result()  # Where the shot will land, it downloads in the background
+        panel_worker.send("scroll", text="AWESOME!")
+        # Thumbnail now, screen sized copy once the download has landed
+        booth.preview_last_shot(last_shot, thumbnail=THUMBNAIL, wait=lambda shot=last_shot:
+                                camera_worker.send("wait_for_download", shot).result())
+        panel_worker.loop("scroll", **attract)
         booth.display_last_shot()
-    elif booth.check_sw_input("print"):
+        booth.buttons.clear()  # Ignore presses made during the countdown
+    elif button["label"] == "print":
         print("Print button was pressed")
-        now = time.time()
-        # Check if we had a recent print
-        try:
-            delta = int(now - last_print)  # noqa: F821
-        except Exception:
-            # There probably wasn't a last_print, so go ahead
-            pass
-        else:
-            # Only print if we haven't in the last 3 seconds (successive pushes)
-            if delta <= 3:
-                continue  # don't print
-        booth.run_as_thread(panel.flash, text="Printing...", executions=1, start=True)
-        while not camera.is_ready():
-            time.sleep(0.01)  # wait for camera to be ready after the shot.
-        printer.text(text=camera.last_shot())
-        printer.ln()
-        printer.qr(content="https://website.com", size=10)  # Could be where the photo was uploaded
-        printer.ln()
-        printer.text(text="Thank you for using our photobooth! "
-                          "Please visit us at http://website.net")
-        printer.cut()
-        last_print = time.time()
+        camera_worker.wait()  # wait for camera to be ready after the shot.
+        last_shot = camera.last_shot()
+        # Presses within 3 seconds of the last print of this shot are coalesced into one job
+        receipt = {"shot": last_shot, "url": "https://website.com"}
+        job = spooler.submit([("receipt", ["thanks"], receipt)], key=last_shot)
+        if spooler.status(job) == "queued":
+            panel_worker.send("flash", text="Printing...")
+            panel_worker.loop("scroll", **attract)
@@ -0,0 +1,84 @@
+"""
+Frame pacing for LED animations
+
+Frames are scheduled against a monotonic clock from the start of the animation,
+so time spent rendering and writing to the strip doesn't add to the frame period.
+When rendering falls behind, frames are dropped to stay on time.
+"""
+import time
+
+DEFAULT_FPS = 60
+
+
+class FrameScheduler():
+    """ Yields frame numbers at a target frame rate
+        Example:
+            timer = FrameScheduler(fps=30)
+            for n in timer.frames(count=90):  # 3 seconds
+                draw(n)
+        Animations should draw based on the frame number they are given,
+        since late frames are skipped when drop_frames is True.
+    """
+    def __init__(self, fps: float = DEFAULT_FPS, drop_frames: bool = True,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.period = 1.0 / fps if fps else 0.0
+        self.drop_frames = drop_frames
+        self._clock = clock
+        self._sleep = sleep
+        self.reset()
+
+    def reset(self):
+        """ Reset frame statistics
+        """
+        self.rendered = 0
+        self.dropped = 0
+        self.late = 0
+        self.max_late = 0.0
+        self.elapsed = 0.0
+
+    def frames(self, count: int = None, period: float = None):
+        """ Generator of frame numbers, paced to period (seconds per frame)
+            count: number of frames, or None to run until the caller stops iterating
+            period: override the period set by fps for this run
+        """
+        self.reset()
+        period = self.period if period is None else period
+        start = self._clock()
+        n = 0
+
+        try:
+            while count is None or n < count:
+                yield n
+                self.rendered += 1
+
+                deadline = start + (n + 1) * period
+                now = self._clock()
+                if now <= deadline:
+                    self._sleep(deadline - now)
+                    n += 1
+                    continue
+
+                # Behind schedule
+                late = now - deadline
+                self.late += 1
+                self.max_late = max(self.max_late, late)
+                skip = int(late / period) if self.drop_frames and period > 0 else 0
+                if count is not None and n + 1 + skip >= count > n + 1:
+                    # Always finish on the last frame
+                    skip = count - n - 2
+                self.dropped += skip
+                n += 1 + skip
+        finally:
+            self.elapsed = self._clock() - start
+
+    def stats(self) -> dict:
+        """ Statistics for the last (or current) run of frames()
+        """
+        return {
+            "rendered": self.rendered,
+            "dropped": self.dropped,
+            "late": self.late,
+            "max_late": self.max_late,
+            "elapsed": self.elapsed,
+            "fps": self.rendered / self.elapsed if self.elapsed else 0.0
+        }
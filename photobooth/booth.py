@@ -8,17 +8,34 @@ import pathlib
 # from typing import get_type_hints
 # from functools import wraps
 # from inspect import getfullargspec
-from multiprocessing import Process, Event
+import threading
+
+from collections import deque
+from concurrent.futures import Future
+from inspect import getfullargspec
+from multiprocessing import Process, Event, Pipe, Queue, Value
 
 
 # Components
 from photobooth.printer import Printer
+from photobooth.spooler import PrinterPool
 from photobooth.neopixel import Neopixel
 from photobooth.camera import Camera
+from photobooth.preview import DEFAULT_SCREEN_SIZE, exif_thumbnail, new_generation, \
+    publish_bytes, publish_file, screen_image
 
 DEFAULT_LOG_LEVEL = logging.INFO
 DEFAULT_LOG_PATH = '/var/log/photobooth.log'
 
+# Return values a Thread() keeps, the oldest are dropped so an endless run can't fill memory
+RESULT_HISTORY = 100
+
+# A Worker().loop() whose method keeps raising waits LOOP_BACKOFF seconds (doubling, up to
+# LOOP_BACKOFF_MAX) between tries, and gives up after LOOP_MAX_FAILURES in a row
+LOOP_BACKOFF = 0.1
+LOOP_BACKOFF_MAX = 5.0
+LOOP_MAX_FAILURES = 5
+
 # def validate_input(obj, **kwargs):
 #     """ Used by type_check()
 #     """
@@ -137,14 +154,52 @@ class Booth():
         if not getattr(self, '_last_shot_tgt', None):
             self.reset_last_shot()
 
-        cmd = f"cp {last_shot} {self._last_shot_tgt}"
         try:
-            run_local_cmd(cmd=cmd)
+            publish_file(last_shot, self._last_shot_tgt,
+                         generation=new_generation(self._last_shot_tgt))
         except Exception as err:
             self.except_and_log(ex_type=Exception, ex_msg=err, log="Tried to copy last shot")
         else:
             return True
 
+    def preview_last_shot(self, last_shot: str, size: tuple = DEFAULT_SCREEN_SIZE,
+                          thumbnail: str = None, wait=None):
+        """ Show last_shot on the last shot screen as fast as possible
+            thumbnail (from Camera().trigger(thumbnail=...)) is published right away. Then,
+            from a background thread (returned, so callers can join() it), once wait() returns
+            (e.g. the download has landed): the thumbnail embedded in the capture's EXIF, if
+            there wasn't one from the camera, and a screen sized copy to replace it.
+            Anything still being written for an older shot is dropped.
+        """
+        if not getattr(self, '_last_shot_tgt', None):
+            self.reset_last_shot()
+        target = self._last_shot_tgt
+        generation = new_generation(target)
+
+        published = False
+        if thumbnail and os.path.exists(thumbnail):
+            try:
+                published = publish_file(thumbnail, target, generation=generation)
+            except Exception as err:
+                self.except_and_log(ex_type=Exception, ex_msg=err,
+                                    log="Tried to preview last shot")
+
+        def downscale():
+            try:
+                if wait is not None:
+                    wait()
+                data = None if published else exif_thumbnail(last_shot)
+                if data and not publish_bytes(data, target, generation=generation):
+                    return  # A newer shot is on screen
+                screen_image(last_shot, target, size=size, generation=generation)
+            except Exception as err:
+                self.except_and_log(ex_type=Exception, ex_msg=err,
+                                    log="Tried to downscale last shot")
+
+        resize = threading.Thread(target=downscale, daemon=True)
+        resize.start()
+        return resize
+
     def display_last_shot(self):
         """ Intended to be ran after start_kiosk()
             Loads a chromium tab that displays last.html from django
@@ -215,9 +270,26 @@ class Booth():
         printer = self._init_printer(name=name, model=model, **kwargs)
         # add the printer to a list of printers (objects)
         self.printers.append(printer)
+        # a running pool only knows the printers it was made with
+        self._stop_printer_pool()
         # provide the printer object back to the caller
         return printer
 
+    def get_printer_pool(self, **kwargs):
+        """ Get the PrinterPool over Booth().printers, starting one if needed
+            Jobs submitted to the pool go to the least busy healthy printer.
+        """
+        if not getattr(self, "printers", None):
+            raise ValueError("No printers have been added. Please use add_printer() first")
+        if not getattr(self, "printer_pool", None):
+            self.printer_pool = PrinterPool(self.printers, **kwargs)
+        return self.printer_pool
+
+    def _stop_printer_pool(self):
+        if getattr(self, "printer_pool", None):
+            self.printer_pool.stop()
+            delattr(self, "printer_pool")
+
     @staticmethod
     def _init_neopixel(**kwargs):
         """ Initialize a 'neopixel' for use.
@@ -302,8 +374,14 @@ class Booth():
         if getattr(self, 'cameras', None):
             delattr(self, 'cameras')
 
+        self._stop_printer_pool()
         if getattr(self, 'printers', None):
             delattr(self, 'printers')
+
+        if getattr(self, 'workers', None):
+            for worker in self.workers.values():
+                worker.stop_immediately()
+            delattr(self, 'workers')
         return True
 
     @staticmethod
@@ -312,6 +390,71 @@ class Booth():
         """
         return Thread(target, *args, **kwargs)
 
+    def get_worker(self, component):
+        """ Get the Worker() for a component (neopixel, camera, printer), starting one if needed
+            Each component gets one persistent worker, so running an effect or a capture
+            is a message to that worker instead of a new process.
+        """
+        if not getattr(self, "workers", None):
+            self.workers = dict()
+
+        worker = self.workers.get(id(component))
+        if not worker or not worker.is_alive():
+            worker = Worker(component, start=True)
+            self.workers[id(component)] = worker
+        return worker
+
+
+class ResultChannel():
+    """ One way pipe for return values from a child process back to the parent
+        Each message is (key, ok, value), where ok is False if value is an exception.
+    """
+    def __init__(self):
+        self._reader, self._writer = Pipe(duplex=False)
+
+    def call(self, key, target, *args, **kwargs):
+        """ Used in the child: run target and send back what it returned or raised
+        """
+        try:
+            value = target(*args, **kwargs)
+        except Exception as err:
+            self.send(key, err, ok=False)
+            raise
+        self.send(key, value)
+        return value
+
+    def send(self, key, value, ok: bool = True):
+        try:
+            self._writer.send((key, ok, value))
+        except Exception as err:
+            # Values that can't be pickled are reported as an error instead
+            self._writer.send((key, False, RuntimeError(f"Unable to send result: {err}")))
+
+    def poll(self, timeout: float = 0) -> bool:
+        return self._reader.poll(timeout)
+
+    def started(self):
+        """ Used in the parent once the child has started: close the parent's end of the
+            writer, so recv() raises EOFError when the child exits
+        """
+        self._writer.close()
+
+    def recv(self):
+        """ Used in the parent: wait for the next (key, ok, value)
+        """
+        return self._reader.recv()
+
+    def collect(self, timeout: float = 0) -> list:
+        """ Used in the parent: everything sent so far, waiting up to timeout for the first
+        """
+        received = list()
+        while self._reader.poll(timeout if not received else 0):
+            try:
+                received.append(self._reader.recv())
+            except EOFError:
+                break
+        return received
+
 
 class Thread():
     """ Leverages multiprocessing(Process, Event)
@@ -325,6 +468,10 @@ class Thread():
         a shared memory variable, otherwise the attribute change won't persist the thread.
 
         See camera.Camera().capture() for an example
+
+        Return values are sent back to the parent through a ResultChannel(), and read
+        as they arrive by a listener thread so the child never blocks on a full pipe.
+        The last RESULT_HISTORY are kept, see Thread().result() and Thread().results
     """
     def __init__(self, target, *args, executions: int = 0, start=False, **kwargs):
         self.inputs = locals()  # For posterity
@@ -333,12 +480,19 @@ class Thread():
         self._kwargs = kwargs
         self._stop_event = Event()
         self.executions = executions if isinstance(executions, int) else 0
-        self.results = list()  # So results are retrievable
+        self._results = deque(maxlen=RESULT_HISTORY)  # So results are retrievable
+        self._received = threading.Condition()
+        self._channel = None
+        self._listener = None
         self._setup()
         if start:
             self.start()
 
     def _setup(self):
+        # Keep anything a previous run sent before replacing the channel
+        if self._listener is not None:
+            self._listener.join()
+        self._channel = ResultChannel()
         # Spawns a process
         self.process = Process(target=self._target,
                                args=self._args,
@@ -346,9 +500,54 @@ class Thread():
         # override the default Process().run() method with Thread()._run()
         self.process.run = self._run
 
+    def _listen(self, channel):
+        """ Runs in the parent, moves what the child sends into self._results until it exits
+        """
+        while True:
+            try:
+                message = channel.recv()
+            except (EOFError, OSError):
+                break
+            with self._received:
+                self._results.append(message)
+                self._received.notify_all()
+        with self._received:
+            self._received.notify_all()
+
+    @property
+    def results(self) -> list:
+        """ The values returned by the target so far (the last RESULT_HISTORY), in order
+            Exceptions raised by the target are included as the exception object.
+        """
+        with self._received:
+            return [value for key, ok, value in self._results]
+
+    def result(self, timeout: float = None):
+        """ The most recent value returned by the target, waiting for one if needed
+            Raises TimeoutError if nothing is returned within timeout,
+            or the exception raised by the target.
+        """
+        start = time.monotonic()
+        with self._received:
+            while not self._results:
+                remaining = None if timeout is None else timeout - (time.monotonic() - start)
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No result from {self._target} within {timeout}s")
+                if self._listener is None or not self._listener.is_alive():
+                    raise RuntimeError(f"{self._target} ended without returning a result")
+                self._received.wait(timeout=0.1 if remaining is None else min(remaining, 0.1))
+            key, ok, value = self._results[-1]
+        if not ok:
+            raise value
+        return value
+
     def start(self):
         # Start the process in this thread
         self.process.start()
+        self._channel.started()
+        self._listener = threading.Thread(target=self._listen, args=(self._channel,),
+                                          name=f"{self.process.name}-results", daemon=True)
+        self._listener.start()
 
     def stop(self, *args, **kwargs):
         # Shortcut for stop_gracefully()
@@ -395,11 +594,212 @@ class Thread():
             # Run n times
             remaining = self.executions
             while remaining > 0:
-                self.results.append(self._target(*self._args, **self._kwargs))
+                self._channel.call(None, self._target, *self._args, **self._kwargs)
                 remaining -= 1
             # Cleanup
             self.process.close()
         else:
             # Run until stopped
             while not self._stop_event.is_set():
-                self.results.append(self._target(*self._args, **self._kwargs))
+                self._channel.call(None, self._target, *self._args, **self._kwargs)
+
+
+class _Interrupt():
+    """ Event-like flag for Worker(), is_set() while commands are waiting behind the current one
+        Passed as stop_event to looping commands that accept it (Neopixel().play())
+    """
+    def __init__(self, worker):
+        self._worker = worker
+
+    def is_set(self):
+        return self._worker._sent.value != self._worker._received
+
+
+class Worker():
+    """ A persistent process that owns one component (neopixel, camera, printer)
+        and runs its methods from a command queue, one at a time, in the order sent.
+
+        send() runs a method once, loop() runs a method repeatedly until the next
+        command is sent. Sending a command is a Queue().put(), no process is spawned.
+        Both return a concurrent.futures.Future() of the method's return value
+        (for loop(), the value returned by its last run).
+
+        Example:
+            panel_worker = booth.get_worker(panel)
+            panel_worker.loop("scroll", text="Press the capture button to begin!  ")
+            panel_worker.send("scroll", text="3...")  # Stops the looping scroll mid message
+            shot = camera_worker.send("capture").result()
+    """
+    def __init__(self, component, name: str = None, start: bool = False):
+        if not name:
+            name = f"worker-{getattr(component, 'name', id(component))}"
+        self.name = name
+        self.component = component
+
+        self._queue = Queue()
+        self._sent = Value('L', 0)  # Commands sent by the parent
+        self._done = Value('L', 0)  # Commands finished (or started, for loops) by the worker
+        self._received = 0  # Only used inside the worker process
+
+        # Return values come back through a pipe, and are matched to futures by a
+        # listener thread in the parent
+        self._channel = ResultChannel()
+        self._futures = dict()
+        self._listener = None
+        self._lock = threading.Lock()  # Guards _futures and _listener
+        self._setup()
+        if start:
+            self.start()
+
+    def _setup(self):
+        self.process = Process(target=self._run, name=self.name, daemon=True)
+
+    def start(self):
+        self.process.start()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def send(self, method: str, *args, **kwargs) -> Future:
+        """ Queue component.method(*args, **kwargs) to run once
+        """
+        return self._put("send", method, args, kwargs)
+
+    def loop(self, method: str, *args, **kwargs) -> Future:
+        """ Queue component.method(*args, **kwargs) to run repeatedly until the next command
+        """
+        return self._put("loop", method, args, kwargs)
+
+    def _put(self, mode, method, args, kwargs) -> Future:
+        if not callable(getattr(self.component, method, None)):
+            raise ValueError(f"{type(self.component).__name__}() has no method '{method}'")
+
+        future = Future()
+        with self._sent.get_lock():
+            self._sent.value += 1
+            key = self._sent.value
+        with self._lock:
+            self._futures[key] = future
+            # The listener exits (under the same lock) once there is nothing to resolve
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen,
+                                                  name=f"{self.name}-results", daemon=True)
+                self._listener.start()
+        self._queue.put((key, mode, method, args, kwargs))
+        return future
+
+    def _listen(self):
+        """ Runs in the parent, resolves futures as results arrive
+        """
+        while True:
+            for key, ok, value in self._channel.collect(timeout=0.1):
+                with self._lock:
+                    future = self._futures.pop(key, None)
+                if future is None:
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+            if not self.is_alive() and not self._channel.poll():
+                self._cancel_futures()
+            with self._lock:
+                if not self._futures:
+                    self._listener = None
+                    return
+
+    def is_busy(self) -> bool:
+        """ True while commands are queued or running. A running loop() doesn't count.
+        """
+        return self._done.value != self._sent.value
+
+    def wait(self, timeout: float = None) -> bool:
+        """ Wait until the worker isn't busy, returns False on timeout
+        """
+        start = time.monotonic()
+        while self.is_busy():
+            if timeout is not None and time.monotonic() - start > timeout:
+                return False
+            time.sleep(0.001)  # check every millisecond
+        return True
+
+    def stop(self, timeout: float = None):
+        """ Let queued commands finish, then end the worker process
+            Counts as a command, so a running loop() is interrupted.
+        """
+        with self._sent.get_lock():
+            self._sent.value += 1
+        self._queue.put(None)
+        self.process.join(timeout)
+        return not self.is_alive()
+
+    def stop_immediately(self):
+        """ Kill the worker process, dropping any queued commands
+        """
+        self.process.kill()
+        self.process.join()
+        self._cancel_futures()
+        return True
+
+    def _cancel_futures(self):
+        with self._lock:
+            futures = list(self._futures.items())
+            self._futures.clear()
+        for key, future in futures:
+            if not future.done():
+                future.set_exception(RuntimeError(f"{self.name} stopped before {key} finished"))
+
+    def _call(self, key, method, args, kwargs, interrupt=None, send=True):
+        """ Run a method on the component, sending the result back if send=True
+            Returns (ok, value)
+        """
+        target = getattr(self.component, method)
+        if interrupt is not None and 'stop_event' in getfullargspec(target).args:
+            kwargs = dict(kwargs, stop_event=interrupt)
+        try:
+            result = (True, target(*args, **kwargs))
+        except Exception as err:
+            # Keep the worker alive for the next command
+            logging.exception(f"{self.name}: {method}() failed")
+            result = (False, err)
+        if send:
+            self._channel.send(key, result[1], ok=result[0])
+        return result
+
+    def _run(self):
+        """ Worker process main loop
+        """
+        interrupt = _Interrupt(self)
+        while True:
+            command = self._queue.get()
+            self._received += 1
+            if command is None:
+                with self._done.get_lock():
+                    self._done.value += 1
+                return
+            key, mode, method, args, kwargs = command
+
+            if mode == "loop":
+                with self._done.get_lock():
+                    self._done.value += 1
+                # Run until a new command has been sent
+                result = (True, None)
+                failures = 0
+                while not interrupt.is_set():
+                    result = self._call(key, method, args, kwargs, interrupt=interrupt, send=False)
+                    failures = 0 if result[0] else failures + 1
+                    if failures >= LOOP_MAX_FAILURES:
+                        logging.error(f"{self.name}: stopped looping {method}() after "
+                                      f"{failures} failures in a row")
+                        break
+                    if failures:
+                        # Wait before trying again, unless a new command arrives
+                        backoff = min(LOOP_BACKOFF * 2 ** (failures - 1), LOOP_BACKOFF_MAX)
+                        deadline = time.monotonic() + backoff
+                        while not interrupt.is_set() and time.monotonic() < deadline:
+                            time.sleep(0.01)
+                self._channel.send(key, result[1], ok=result[0])
+            else:
+                self._call(key, method, args, kwargs)
+                with self._done.get_lock():
+                    self._done.value += 1
@@ -7,19 +7,83 @@ libgphoto2      2.5.22         all camlibs, gcc, ltdl, EXIF
 libgphoto2_port 0.12.0         iolibs: disk ptpip serial usb1 usbdiskdirect usbscsi, gcc, ltdl, USB, serial without locking  # noqa: E501
 """
 import subprocess
+import collections
+import threading
+import queue
+import hashlib
+import json
+import logging
+import selectors
+import shlex
+import shutil
+import time
 import re
 import os
 
-from multiprocessing import Manager
-from ctypes import c_wchar_p, c_bool
+from concurrent.futures import Future, wait
+from multiprocessing import Lock
+from multiprocessing.sharedctypes import RawValue
+from ctypes import Structure, c_bool, c_char, c_uint32
 from datetime import datetime
 from sys import platform
 
+from photobooth.camera_models import ModelIndex
+from photobooth.derivatives import DerivativeCache
+from photobooth.storage import CaptureStore
+
 # Import not working for some reason
 # from photobooth.booth import run_local_cmd
 
 DEFAULT_CAPTURE_DIR = "/opt/captures"
 
+# The gphoto2 binary, can be pointed at a stand-in (see tests/fake_gphoto2.py)
+GPHOTO2 = os.environ.get("PHOTOBOOTH_GPHOTO2", "gphoto2")
+
+# Seconds to wait on a gphoto2 --shell command before giving up
+SHELL_TIMEOUT = 30
+
+# gphoto2 --shell prompt: "gphoto2: {local dir} camera folder> "
+SHELL_PROMPT = re.compile(rb"gphoto2: \{[^}]*\} [^\n]*> $")
+
+# Errors that mean the USB/PTP session is gone, and reconnecting may fix it
+USB_ERRORS = ["I/O problem", "Could not claim the USB device",
+              "Could not find the requested device", "PTP I/O Error",
+              "Camera is already in use", "No camera found"]
+
+# Longest path that can be stored as the last shot
+MAX_PATH_LEN = 4096
+
+# Shots that can be waiting to download before trigger() blocks (the camera's buffer)
+DEFAULT_DOWNLOAD_QUEUE = 8
+
+# Parsed --list-cameras output is cached here, keyed by the gphoto2/libgphoto2 versions
+DEFAULT_CAMERA_CACHE_DIR = "~/.cache/photobooth/gphoto2"
+
+# Seconds that --auto-detect results are reused for, unless a USB device is (un)plugged
+DETECT_TTL = 5.0
+
+# USB device nodes, one dir per bus with one file per device
+USB_DEVICES = "/dev/bus/usb"
+
+# In process caches, see supported_camera_list(), get_cameras() and config_gphoto2()
+_gphoto2_checked = set()
+_gphoto2_version = dict()
+_supported_cameras = dict()  # version key: ModelIndex
+_detected_cameras = dict()  # (usb signature, time, cameras)
+_applied_config = dict()  # (usb signature, config)
+
+
+class CameraState(Structure):
+    """ Camera state that is shared across forks, in one block of shared memory
+        Reading a field is a memory read, there is no Manager() server process.
+    """
+    _fields_ = [
+        ("ready", c_bool),
+        ("captures", c_uint32),
+        ("downloads", c_uint32),  # Shots triggered but not downloaded yet
+        ("last_shot", c_char * MAX_PATH_LEN)
+    ]
+
 
 # Adding statically since import isnt working
 def run_local_cmd(cmd):
@@ -73,36 +137,141 @@ def check_dir_rw_or_make(tgt_dir: str, mkdir_perms=0o766):
 def check_gphoto2():
     """ verify gphoto2 is installed
     """
+    if GPHOTO2 in _gphoto2_checked:
+        return True  # Only looked up once per process
+
     check_os()  # No reason to check if its not linux (wont have gphoto2)
 
-    result = subprocess.run("which gphoto2", shell=True, capture_output=True)
-    check = result.stdout.decode("utf-8").strip("\n").split("/")[-1:]
+    result = subprocess.run(f"which {GPHOTO2}", shell=True, capture_output=True)
 
-    if 'gphoto2' not in check:
+    if result.returncode != 0 or not result.stdout.strip():
         # TODO: is this the right exception to raise?
         raise RuntimeError("GPhoto2 was not found on this system")
     else:
+        _gphoto2_checked.add(GPHOTO2)
         return True
 
 
+def gphoto2_version() -> str:
+    """ The gphoto2 and libgphoto2 version lines of `gphoto2 --version`
+        The supported camera list only changes when one of these does.
+    """
+    if GPHOTO2 not in _gphoto2_version:
+        check_gphoto2()
+        result = subprocess.run(f"{GPHOTO2} --version", shell=True, capture_output=True)
+        lines = result.stdout.decode("utf-8").split("\n")
+        _gphoto2_version[GPHOTO2] = "\n".join(
+            line.strip() for line in lines if re.match(r"(lib)?gphoto2\b", line))
+    return _gphoto2_version[GPHOTO2]
+
+
+def usb_signature() -> str:
+    """ A hash of the USB device nodes, which changes whenever a device is (un)plugged
+        Used to invalidate cached camera detection. Empty if USB_DEVICES isn't available.
+    """
+    if not os.path.isdir(USB_DEVICES):
+        return ""
+    nodes = list()
+    for bus in sorted(os.listdir(USB_DEVICES)):
+        bus_dir = os.path.join(USB_DEVICES, bus)
+        if os.path.isdir(bus_dir):
+            nodes.extend(f"{bus}/{device}" for device in sorted(os.listdir(bus_dir)))
+    return hashlib.sha1("\n".join(nodes).encode("utf-8")).hexdigest()
+
+
+def clear_camera_cache(disk: bool = False):
+    """ Forget cached gphoto2 results, so the next calls run gphoto2 again
+        disk also removes the saved supported camera lists.
+    """
+    _gphoto2_checked.clear()
+    _gphoto2_version.clear()
+    _supported_cameras.clear()
+    _detected_cameras.clear()
+    _applied_config.clear()
+    cache_dir = os.path.expanduser(DEFAULT_CAMERA_CACHE_DIR)
+    if disk and os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.startswith("supported-"):
+                os.remove(os.path.join(cache_dir, name))
+    return True
+
+
+def _load_supported_cameras(cache_dir: str = DEFAULT_CAMERA_CACHE_DIR) -> ModelIndex:
+    """ Index of the models the installed gphoto2 supports, parsing --list-cameras only if it
+        isn't cached in memory or on disk for this version
+    """
+    version = gphoto2_version()
+    key = hashlib.sha1(f"{GPHOTO2}\n{version}".encode("utf-8")).hexdigest()[:16]
+    if key in _supported_cameras:
+        return _supported_cameras[key]
+
+    path = os.path.join(os.path.expanduser(cache_dir), f"supported-{key}.json")
+    models = None
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as fh:
+                cached = json.load(fh)
+            if cached.get("version") == version:
+                models = cached["models"]
+        except (OSError, ValueError, KeyError):
+            pass  # Corrupt, parse it again below
+
+    if models is None:
+        # Capture and cleanup camera list output
+        cameras = subprocess.run(f"{GPHOTO2} --list-cameras", shell=True, capture_output=True)
+        cameras = cameras.stdout.decode("utf-8").split("\n\t")
+        models = [v.strip("\n").strip('"') for v in cameras][1:]  # Slice removes the header
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as fh:
+                json.dump({"version": version, "models": models}, fh)
+            os.replace(tmp, path)
+        except OSError:
+            pass  # Not being able to cache to disk only costs a re-parse next start
+
+    _supported_cameras[key] = ModelIndex(models)
+    return _supported_cameras[key]
+
+
 def supported_camera_list():
     """ Grabs the list of gphoto2 cameras and parses into a list
+        Cached per gphoto2 version, in memory and in DEFAULT_CAMERA_CACHE_DIR
     """
     check_gphoto2()  # No reason to keep going if GPhoto2 isn't installed
 
-    # TODO: Error checking/Handling
+    return list(_load_supported_cameras().models)
+
 
-    # Capture and cleanup camera list output
-    cameras = subprocess.run("gphoto2 --list-cameras", shell=True, capture_output=True)
-    cameras = cameras.stdout.decode("utf-8").split("\n\t")
-    return [v.strip("\n").strip('"') for v in cameras][1:]  # Slice removes the table header
+def suggest_camera_models(model: str, k: int = 5) -> list:
+    """ The k supported models closest to model, as [(model, score)] best first
+    """
+    return _load_supported_cameras().search(model, k=k)
 
 
-def get_cameras() -> list:
+def resolve_camera_model(model: str) -> str:
+    """ The supported model that best matches a partial or misspelled model
+        Raises a ValueError with suggestions if nothing is close
+    """
+    check_gphoto2()
+    return _load_supported_cameras().resolve(model)
+
+
+def get_cameras(max_age: float = DETECT_TTL) -> list:
     """  Grabs a list of connected cameras
+        Results are reused for max_age seconds, unless a USB device is (un)plugged.
+        max_age=0 always runs detection.
     """
     check_gphoto2()  # No reason to keep going if GPhoto2 isn't installed
-    cameras = subprocess.run("gphoto2 --auto-detect", shell=True, capture_output=True)
+
+    signature = usb_signature()
+    cached = _detected_cameras.get(GPHOTO2)
+    if cached and max_age:
+        cached_signature, detected_at, detected_cameras = cached
+        if cached_signature == signature and time.monotonic() - detected_at < max_age:
+            return [dict(camera) for camera in detected_cameras]
+
+    cameras = subprocess.run(f"{GPHOTO2} --auto-detect", shell=True, capture_output=True)
 
     # TODO: Error checking/Handling
 
@@ -114,7 +283,8 @@ def get_cameras() -> list:
         model, addr = re.split(" {2,}", c)
         detected_cameras.append({"model": model, "addr": addr})
 
-    return detected_cameras
+    _detected_cameras[GPHOTO2] = (signature, time.monotonic(), detected_cameras)
+    return [dict(camera) for camera in detected_cameras]
 
 
 def capture_and_download(download_dir: str, camera: str, port: str):
@@ -125,7 +295,7 @@ def capture_and_download(download_dir: str, camera: str, port: str):
 
     filename = f"{download_dir}/{ds}.jpg"
 
-    result = subprocess.run("gphoto2 --capture-image-and-download --keep-raw "
+    result = subprocess.run(f"{GPHOTO2} --capture-image-and-download --keep-raw "
                             f"--filename '{filename}' "
                             F"--camera '{camera}' "
                             f"--port '{port}' ",
@@ -143,10 +313,16 @@ def capture_and_download(download_dir: str, camera: str, port: str):
 
 def config_gphoto2(*args, **kwargs):
     """ Change config elements about gphoto2.
+        Skipped if the same config was already set, and no USB device has been (un)plugged since
     """
     args = ' '.join([v for v in args])
     kwargs = ' '.join([f"{k}={v}" for k, v in kwargs.items()])
-    result = subprocess.run(f"gphoto2 --set-config {args} {kwargs}",
+    config = f"{args} {kwargs}"
+    signature = usb_signature()
+    if _applied_config.get(GPHOTO2) == (signature, config):
+        return True
+
+    result = subprocess.run(f"{GPHOTO2} --set-config {config}",
                             shell=True, capture_output=True)
 
     # TODO: Can probably expand exceptions for better handling in higherlevel logic
@@ -155,6 +331,323 @@ def config_gphoto2(*args, **kwargs):
                         f"stdout: {result.stdout.decode('utf-8')}\n"
                         f"stderr: {result.stderr.decode('utf-8')}")
     else:
+        _applied_config[GPHOTO2] = (signature, config)
+        return True
+
+
+class GPhoto2Error(Exception):
+    """ gphoto2 reported an error
+    """
+
+
+class GPhoto2Timeout(GPhoto2Error):
+    """ gphoto2 --shell didn't answer in time, its late output would be read as the next reply
+    """
+
+
+class GPhoto2Session():
+    """ A long lived `gphoto2 --shell` coprocess for one camera/port
+        Keeps the USB/PTP session open between captures, instead of re-detecting the
+        camera and re-opening the session for every shot like the gphoto2 CLI does.
+        If the session drops (USB error, camera power cycled) it is re-opened and
+        the command is retried once. A command that times out kills the session, so the
+        next command starts a new one instead of reading the late reply.
+    """
+    def __init__(self, camera: str, port: str, download_dir: str, timeout: float = SHELL_TIMEOUT):
+        self.camera = camera
+        self.port = port
+        self.download_dir = download_dir
+        self.timeout = timeout
+        self.download_time = None  # Running average of download() in seconds
+        self.proc = None
+        self.pid = None  # The process that opened the session
+        self.config = dict()
+        self.reconnects = 0
+        # Commands can come from the shutter and the download queue's thread
+        self._lock = threading.RLock()
+        # Cleared while a trigger is waiting, so downloads step aside between files
+        self._shutter_free = threading.Event()
+        self._shutter_free.set()
+
+    def is_open(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None and self.pid == os.getpid()
+
+    def open(self):
+        """ Start gphoto2 --shell and wait for its prompt
+        """
+        self.close()
+        self.proc = subprocess.Popen([GPHOTO2, "--camera", self.camera, "--port", self.port,
+                                      "--shell"],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT, cwd=self.download_dir)
+        self.pid = os.getpid()
+        try:
+            self._read_until_prompt()
+            # Config doesn't survive a new session
+            for k, v in self.config.items():
+                self._command(f"set-config {k}={v}")
+        except BaseException:
+            self.kill()
+            raise
+        return True
+
+    def close(self):
+        if self.proc is None:
+            return True
+        if self.pid == os.getpid() and self.proc.poll() is None:
+            try:
+                self.proc.stdin.write(b"exit\n")
+                self.proc.stdin.flush()
+                self.proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.proc.kill()
+        self.proc = None
+        return True
+
+    def kill(self):
+        """ End the shell without asking it to exit, for when it can't be trusted to answer
+        """
+        if self.proc is not None and self.pid == os.getpid() and self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc = None
+        return True
+
+    def _read_until_prompt(self) -> str:
+        """ Read output until the shell prompt, returns everything before it
+        """
+        output = bytearray()
+        deadline = time.monotonic() + self.timeout
+        fd = self.proc.stdout.fileno()
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while not SHELL_PROMPT.search(output):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise GPhoto2Timeout(f"Timed out waiting for gphoto2 --shell: {output}")
+                if not selector.select(remaining):
+                    continue
+                chunk = os.read(fd, 4096)
+                if not chunk:
+                    raise GPhoto2Error(f"gphoto2 --shell exited: {output.decode('utf-8')}")
+                output += chunk
+
+        text = SHELL_PROMPT.sub(b"", bytes(output)).decode("utf-8")
+        if "*** Error" in text:
+            raise GPhoto2Error(text)
+        return text
+
+    def _command(self, line: str) -> str:
+        self.proc.stdin.write(f"{line}\n".encode("utf-8"))
+        self.proc.stdin.flush()
+        return self._read_until_prompt()
+
+    def command(self, line: str) -> str:
+        """ Run a shell command, reconnecting and retrying once if the session dropped
+        """
+        with self._lock:
+            if not self.is_open():
+                self.open()
+            try:
+                return self._command(line)
+            except GPhoto2Timeout:
+                self.kill()
+                raise
+            except (GPhoto2Error, OSError) as err:
+                if isinstance(err, GPhoto2Error) and self.proc.poll() is None and \
+                        not any(e in str(err) for e in USB_ERRORS):
+                    raise  # gphoto2 answered with an error, the session is still in step
+                self.reconnects += 1
+                self.open()
+            except BaseException:
+                self.kill()
+                raise
+            try:
+                return self._command(line)
+            except GPhoto2Timeout:
+                self.kill()
+                raise
+            except GPhoto2Error:
+                raise
+            except BaseException:
+                self.kill()
+                raise
+
+    def set_config(self, **kwargs):
+        """ Set config values, and remember them for reconnects
+        """
+        for k, v in kwargs.items():
+            self.command(f"set-config {k}={v}")
+            self.config[k] = v
+        return True
+
+    def _lcd(self, download_dir: str):
+        """ Point the shell's local (download) dir at download_dir
+        """
+        if download_dir != self.download_dir:
+            self.download_dir = download_dir
+            if self.is_open():
+                self.command(f"lcd {shlex.quote(download_dir)}")
+
+    def _rename(self, saved: list, filename: str) -> str:
+        """ Rename the files gphoto2 saved to filename, keeping each extension (RAW)
+            Returns the path of the .jpg
+        """
+        stem = os.path.splitext(filename)[0]
+        result = None
+        for name in saved:
+            src = os.path.join(self.download_dir, name.strip())
+            ext = os.path.splitext(src)[1].lower()
+            dst = filename if ext in (".jpg", ".jpeg") else f"{stem}{ext}"
+            os.replace(src, dst)
+            if result is None or dst == filename:
+                result = dst
+        return result
+
+    def capture(self, filename: str) -> str:
+        """ Capture and download to filename (a .jpg path), returns filename
+            Any other files from the same shot (RAW) are renamed to match.
+        """
+        self._lcd(os.path.dirname(filename))
+
+        output = self.command("capture-image-and-download")
+        saved = re.findall(r"Saving file as (.+)", output)
+        if not saved:
+            raise GPhoto2Error(f"Nothing was downloaded from the capture:\n{output}")
+        return self._rename(saved, filename)
+
+    def trigger(self) -> list:
+        """ Fire the shutter without downloading, returns the file paths on the camera
+            Use download() to fetch them later.
+        """
+        self._shutter_free.clear()
+        try:
+            output = self.command("capture-image")
+        finally:
+            self._shutter_free.set()
+        files = re.findall(r"New file is in location (.+) on the camera", output)
+        if not files:
+            raise GPhoto2Error(f"The camera didn't report a new file:\n{output}")
+        return [f.strip() for f in files]
+
+    def thumbnail(self, camera_files: list, filename: str) -> str:
+        """ Download the camera's thumbnail of a shot from trigger() to filename
+            Only a few KB, so it can be on screen long before the full file has downloaded.
+            Returns filename, or None if the camera doesn't have one.
+        """
+        jpegs = [f for f in camera_files if os.path.splitext(f)[1].lower() in (".jpg", ".jpeg")]
+        if not jpegs:
+            return None
+        # Saved to the current download dir (changing it would race a download in progress)
+        with self._lock:
+            output = self.command(f"get-thumbnail {shlex.quote(jpegs[0])}")
+            saved = re.findall(r"Saving file as (.+)", output)
+            if not saved:
+                return None
+            shutil.move(os.path.join(self.download_dir, saved[0].strip()), filename)
+        return filename
+
+    def download(self, camera_files: list, filename: str) -> str:
+        """ Download files from trigger() to filename (a .jpg path), returns filename
+        """
+        self._lcd(os.path.dirname(filename))
+
+        began = time.monotonic()
+        saved = list()
+        for camera_file in camera_files:
+            self._shutter_free.wait()  # A waiting trigger goes first
+            output = self.command(f"get {shlex.quote(camera_file)}")
+            saved.extend(re.findall(r"Saving file as (.+)", output))
+        if not saved:
+            raise GPhoto2Error(f"Nothing was downloaded for {camera_files}")
+
+        took = time.monotonic() - began
+        self.download_time = took if self.download_time is None \
+            else (self.download_time + took) / 2
+        return self._rename(saved, filename)
+
+
+class DownloadQueue():
+    """ Downloads shots left on the camera by GPhoto2Session.trigger(), from a background thread
+        The queue is bounded (like the camera's buffer), put() blocks while it is full.
+        on_download(path) is called from the download thread as each shot lands, after its
+        future is resolved. If it raises, the error is logged, the shot still downloaded.
+    """
+    def __init__(self, session: GPhoto2Session, maxsize: int = DEFAULT_DOWNLOAD_QUEUE,
+                 on_download=None):
+        self.session = session
+        self.maxsize = maxsize
+        self.on_download = on_download
+        self.futures = dict()  # local filename: Future
+        self.queue = None
+        self.thread = None
+        self.pid = None  # The process that started the thread
+
+    def _start(self):
+        if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+            # Threads don't survive a fork, each process gets its own
+            self.queue = queue.Queue(maxsize=self.maxsize)
+            self.thread = threading.Thread(target=self._run, name="gphoto2-downloads",
+                                           daemon=True)
+            self.pid = os.getpid()
+            self.thread.start()
+
+    def put(self, camera_files: list, filename: str, timeout: float = None) -> Future:
+        """ Queue files from trigger() to be downloaded to filename (a .jpg path)
+            Returns a Future of the downloaded path
+        """
+        self._start()
+        future = Future()
+        self.futures[filename] = future
+        try:
+            self.queue.put((camera_files, filename, future), timeout=timeout)
+        except queue.Full:
+            del self.futures[filename]
+            raise
+        return future
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            camera_files, filename, future = item
+            try:
+                pic = self.session.download(camera_files, filename)
+            except Exception as err:
+                future.set_exception(err)
+                continue
+            else:
+                future.set_result(pic)
+            finally:
+                self.futures.pop(filename, None)
+                self.queue.task_done()
+            if self.on_download:
+                try:
+                    self.on_download(pic)
+                except Exception:
+                    logging.exception(f"Recording the download of {pic} failed")
+
+    def pending(self) -> int:
+        """ Number of shots waiting to download, including the one downloading
+        """
+        return len(self.futures)
+
+    def join(self, timeout: float = None) -> bool:
+        """ Wait for every queued shot to download, returns False on timeout
+        """
+        # Failed downloads count as finished, they are reported through their future
+        done, not_done = wait(list(self.futures.values()), timeout=timeout)
+        return not not_done
+
+    def close(self, timeout: float = None):
+        """ Finish the queued downloads and stop the thread
+        """
+        if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=timeout)
+        self.thread = None
         return True
 
 
@@ -169,19 +662,24 @@ class Camera():
     """
     def __init__(self, model: str,
                  output_dir: str = DEFAULT_CAPTURE_DIR, name: str = "",
-                 leave_raw: bool = True):
+                 leave_raw: bool = True,
+                 persistent: bool = True,
+                 derivatives: DerivativeCache = None,
+                 port: str = None,
+                 store: CaptureStore = None):
         self.inputs = locals()
 
-        """ Set Queue() attributes
-            Using Queue(), we can enable certain attributes to exist uniquely across forks
-              that are spawned by threading.Thread(), multiprocessing.Process(), etc.
+        """ Set shared attributes
+            Using shared memory (CameraState), certain attributes exist uniquely across forks
+              that are spawned by Thread(), Worker(), multiprocessing.Process(), etc.
             This adds some complexity to the class under the covers, but doesn't change much
               around the usage. If higher level logic is not using Thread() / Process(),
               this shouldn't effect anything.
+            The list of captures is kept in a CaptureStore (SQLite) in the output dir.
         """
-        self._ready = Manager().Value(c_bool, False)
-        self._last_shot = Manager().Value(c_wchar_p, "None")
-        self._captures = Manager().list()
+        self._state = RawValue(CameraState)
+        self._state_lock = Lock()
+        self._state.last_shot = b"None"
 
         if not name:
             # Forces a unique camera name
@@ -195,68 +693,379 @@ class Camera():
             "~") else os.path.expanduser(output_dir)
 
         check_dir_rw_or_make(output_dir)
+        self.store = store if store else CaptureStore(self.output_dir)
 
-        supported_cameras = supported_camera_list()
-
-        # Quick Check
-        if self.model not in supported_cameras:
-            match = False
-            # Try to resolve a partial model to a full model (first match, not best)
-            for a_model in supported_cameras:
-                if self.model.lower() in a_model.lower():
-                    match = True
-                    self.model = a_model
-            if not match:
-                raise Exception(f"Provided model ({self.model}) not in supported list. "
-                                "Please check the list of supported camera models via:\n"
-                                "from photobooth.camera import supported_camera_list\n"
-                                "supported_camera_list()")
+        # Resolve a partial model to the best matching full model
+        self.model = resolve_camera_model(self.model)
 
+        # Identical bodies only differ by port, so the port picks between them
         for camera in self.detected_cameras:
             model = camera["model"]
             addr = camera["addr"]
 
-            if self.model in model:
+            if self.model in model and (not port or addr == port):
                 self.addr = addr
+                break
 
         if not self.addr:
-            raise Exception(f"Requested camera ({self.model}) isn't detected\n"
+            on_port = f" on port {port}" if port else ""
+            raise Exception(f"Requested camera ({self.model}){on_port} isn't detected\n"
                             f"Detected cameras: \n{self.detected_cameras}")
 
         # Configure GPhoto2
         config_gphoto2(capturetarget=int(leave_raw))
 
+        # Keep a gphoto2 --shell session open between captures, opened on first use
+        # so it belongs to the process that captures (see GPhoto2Session)
+        self.session = None
+        if persistent:
+            self.session = GPhoto2Session(camera=self.model, port=self.addr,
+                                          download_dir=self.output_dir)
+            self.session.config["capturetarget"] = int(leave_raw)
+
+        # Shots from trigger() are downloaded in the background, see DownloadQueue
+        self.downloads = None
+        if self.session:
+            self.downloads = DownloadQueue(self.session, on_download=self._log_capture)
+
+        # Screen, thumbnail and print sized versions are made in the background after each capture
+        self.derivatives = derivatives
+
         # Init is done
-        self._ready.value = True
+        self._state.ready = True
 
     def is_ready(self):
-        return self._ready.value
+        return self._state.ready
+
+    def capture_count(self):
+        return self._state.captures
 
     def captures(self):
-        return list(self._captures)
+        """ List of captures taken by this camera, oldest first, read from the capture store
+        """
+        return self.store.paths(camera=self.name)
 
     def last_shot(self):
-        return self._last_shot.value
+        return self._state.last_shot.decode("utf-8")
+
+    def downloads_pending(self):
+        """ Shots that have been triggered, but haven't landed in output_dir yet
+        """
+        return self._state.downloads
+
+    def _log_capture(self, pic: str, session: str = None):
+        """ Record a capture in shared memory and the capture store
+            session groups the shots of a burst or group capture
+        """
+        with self._state_lock:
+            self._state.captures += 1
+            self._state.last_shot = pic.encode("utf-8")[:MAX_PATH_LEN - 1]
+        self.store.add(pic, camera=self.name, session=session)
+        if self.derivatives:
+            future = self.derivatives.submit(pic)
+            future.add_done_callback(
+                lambda f: f.exception() or self.store.add_derivatives(pic, f.result()))
 
     def copy_last_shot_to_dir(self, dir: str):
         """ Copy the last shot to the target directory
         """
         rw = check_dir_rw_or_make(tgt_dir=dir)
         if rw:
-            run_local_cmd(f"cp {self._last_shot.value} {dir}")
+            run_local_cmd(f"cp {self.last_shot()} {dir}")
             return True
         else:
             return False
 
     # TODO: Functions that the camera can do
+    def _new_filename(self) -> str:
+        ds = datetime.now().strftime("%Y%m%d-%Hh%Mm%Ss-%f")
+        return f"{self.output_dir}/{ds}.jpg"
+
     def capture(self):
         """ Captures an image and downloads it to self.output_dir
         """
         if not self.is_ready():
             raise Exception("This camera is currently busy, please wait until is_ready()")
-        self._ready.value = False
-        pic = capture_and_download(download_dir=self.output_dir, camera=self.model, port=self.addr)
-        self._captures.append(pic)
-        self._last_shot.value = pic
-        self._ready.value = True
+        self._state.ready = False
+        try:
+            if self.session:
+                pic = self.session.capture(self._new_filename())
+            else:
+                pic = capture_and_download(download_dir=self.output_dir, camera=self.model,
+                                           port=self.addr)
+        finally:
+            self._state.ready = True
+        self._log_capture(pic)
         return pic
+
+    def trigger(self, callback=None, thumbnail: str = None) -> str:
+        """ Fire the shutter and queue the download, returns the path the shot will land at
+            The camera is ready for the next shot as soon as this returns, while the file
+            downloads in the background. callback(path) is called once it has landed,
+            see also download_future() and wait_for_download().
+            If thumbnail (a .jpg path) is provided, the camera's thumbnail of the shot is
+            saved there before this returns (it is removed if the camera doesn't have one).
+            Without a gphoto2 session this is the same as capture().
+        """
+        if not self.downloads:
+            pic = self.capture()
+            if callback:
+                callback(pic)
+            return pic
+
+        if not self.is_ready():
+            raise Exception("This camera is currently busy, please wait until is_ready()")
+        self._state.ready = False
+        try:
+            camera_files = self.session.trigger()
+            pic = self._new_filename()
+            if thumbnail:
+                # Ahead of the download, so a preview can be shown straight away
+                try:
+                    saved = self.session.thumbnail(camera_files, thumbnail)
+                except (GPhoto2Error, OSError):
+                    saved = None
+                if not saved and os.path.exists(thumbnail):
+                    os.remove(thumbnail)  # Don't leave the last shot's thumbnail to be shown
+            with self._state_lock:
+                self._state.downloads += 1
+            try:
+                # Blocks while the queue is full, the camera's buffer is only so big
+                future = self.downloads.put(camera_files, pic)
+            except Exception:
+                self._download_done()
+                raise
+            future.add_done_callback(self._download_done)
+        finally:
+            self._state.ready = True
+
+        if callback:
+            future.add_done_callback(lambda f: f.exception() or callback(f.result()))
+        return pic
+
+    def _download_done(self, future: Future = None):
+        """ Called from the download thread as each triggered shot lands (or fails)
+        """
+        with self._state_lock:
+            self._state.downloads -= 1
+
+    def download_future(self, pic: str) -> Future:
+        """ The Future of a shot from trigger(), None once it has landed (or in other processes)
+        """
+        return self.downloads.futures.get(pic) if self.downloads else None
+
+    def wait_for_download(self, pic: str = None, timeout: float = None) -> bool:
+        """ Wait for a shot from trigger() to land, or every queued shot if pic isn't provided
+            Returns False on timeout
+        """
+        if not self.downloads:
+            return True
+        if pic is None:
+            return self.downloads.join(timeout=timeout)
+        future = self.download_future(pic)
+        if future is not None:
+            done, not_done = wait([future], timeout=timeout)
+            return not not_done
+        return True
+
+    def burst(self, count: int = 4, interval: float = 1.0) -> list:
+        """ Capture count images, interval seconds apart, returns the file paths in order
+            See iter_burst()
+        """
+        return list(self.iter_burst(count=count, interval=interval))
+
+    def iter_burst(self, count: int = 4, interval: float = 1.0):
+        """ Capture count images, interval seconds apart, yielding file paths in order as they land
+            Shots are triggered on schedule, and earlier shots are downloaded from the camera
+            in the time between triggers when the download is expected to fit. Whatever
+            doesn't fit is downloaded after the last shot.
+        """
+        if not self.is_ready():
+            raise Exception("This camera is currently busy, please wait until is_ready()")
+        self._state.ready = False
+        session = f"{self.name}-{datetime.now().strftime('%Y%m%d-%Hh%Mm%Ss-%f')}"
+        try:
+            if not self.session:
+                # The CLI can't split capture and download, shoot one at a time
+                start = time.monotonic()
+                for i in range(count):
+                    time.sleep(max(0.0, start + (i * interval) - time.monotonic()))
+                    pic = capture_and_download(download_dir=self.output_dir, camera=self.model,
+                                               port=self.addr)
+                    self._log_capture(pic, session=session)
+                    yield pic
+                return
+
+            pending = collections.deque()  # (files on the camera, local filename)
+            start = time.monotonic()
+            for i in range(count):
+                trigger_at = start + (i * interval)
+                # Download earlier shots while the next trigger isn't due
+                # Until a download has been timed, guess it takes half the interval
+                while pending and time.monotonic() + (
+                        self.session.download_time or interval / 2) <= trigger_at:
+                    pic = self.session.download(*pending.popleft())
+                    self._log_capture(pic, session=session)
+                    yield pic
+                time.sleep(max(0.0, trigger_at - time.monotonic()))
+                pending.append((self.session.trigger(), self._new_filename()))
+
+            while pending:
+                pic = self.session.download(*pending.popleft())
+                self._log_capture(pic, session=session)
+                yield pic
+        finally:
+            self._state.ready = True
+
+    def close(self):
+        """ Finish any queued downloads, and close the gphoto2 session if one is open
+        """
+        if self.downloads:
+            self.downloads.close()
+        if self.session:
+            self.session.close()
+        self.store.close()
+        return True
+
+
+class CameraGroup():
+    """ Several cameras fired together, for multi angle shots
+        Cameras are addressed by port, so identical bodies can be used side by side.
+        Each camera keeps its own gphoto2 --shell session (on its own USB device), so
+        triggers and downloads run in parallel, one thread per camera.
+            group = CameraGroup.detect("Canon EOS 1100D", output_dir="/opt/captures")
+            shot = group.capture()
+            shot["files"]  # {camera name: path}
+            shot["skew"]  # seconds between the first and last shutter
+    """
+    def __init__(self, cameras: list, name: str = ""):
+        if not cameras:
+            raise ValueError("A CameraGroup needs at least one camera")
+        ports = [camera.addr for camera in cameras]
+        if len(set(ports)) != len(ports):
+            raise ValueError(f"Each camera in a group must be on its own port. Received: {ports}")
+
+        if not name:
+            # Forces a unique group name
+            name = f"camera-group-{id(self)}"
+        self.name = name
+        self.cameras = list(cameras)
+        self.last_skew = None
+
+    @classmethod
+    def detect(cls, model: str = None, output_dir: str = DEFAULT_CAPTURE_DIR, **kwargs):
+        """ A group of every detected camera (matching model, if provided)
+            Each camera saves to its own sub dir of output_dir, named after its port, and
+            they share one CaptureStore in output_dir.
+            kwargs are passed along to Camera()
+        """
+        check_dir_rw_or_make(output_dir)
+        if "store" not in kwargs:
+            kwargs["store"] = CaptureStore(output_dir)
+        cameras = list()
+        for detected in get_cameras(max_age=0):
+            if model and resolve_camera_model(model) not in detected["model"]:
+                continue
+            port = detected["addr"]
+            name = re.sub(r"[^\w]+", "-", port).strip("-")
+            camera_dir = os.path.join(os.path.expanduser(output_dir), name)
+            check_dir_rw_or_make(camera_dir)
+            cameras.append(Camera(model=detected["model"], output_dir=camera_dir, name=name,
+                                  port=port, **kwargs))
+        if not cameras:
+            raise Exception(f"No cameras{f' ({model})' if model else ''} were detected")
+        return cls(cameras)
+
+    def is_ready(self):
+        return all(camera.is_ready() for camera in self.cameras)
+
+    def _fire(self, i, barrier, results, session, deadline):
+        """ Runs in one thread per camera, every thread is released by the barrier at once
+            If a camera fails before the barrier (or they don't all get there by the
+            deadline) the barrier is broken, so no camera fires and none is left waiting.
+        """
+        camera = self.cameras[i]
+        result = {"camera": camera.name, "port": camera.addr, "file": None, "error": None}
+        results[i] = result
+        try:
+            try:
+                if camera.session and not camera.session.is_open():
+                    camera.session.open()  # So opening the session doesn't add to the skew
+                barrier.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except threading.BrokenBarrierError:
+                raise GPhoto2Error("Not fired, another camera in the group failed or timed out")
+            except Exception:
+                barrier.abort()
+                raise
+            result["fired_at"] = time.monotonic()
+            if camera.session:
+                camera_files = camera.session.trigger()
+                result["trigger"] = time.monotonic() - result["fired_at"]
+                began = time.monotonic()
+                pic = camera.session.download(camera_files, camera._new_filename())
+                result["download"] = time.monotonic() - began
+            else:
+                # The CLI can't split the trigger from the download
+                pic = capture_and_download(download_dir=camera.output_dir,
+                                           camera=camera.model, port=camera.addr)
+                result["trigger"] = time.monotonic() - result["fired_at"]
+                result["download"] = 0.0
+            camera._log_capture(pic, session=session)
+            result["file"] = pic
+        except Exception as err:
+            result["error"] = err
+        finally:
+            camera._state.ready = True
+
+    def capture(self, timeout: float = SHELL_TIMEOUT) -> dict:
+        """ Fire every camera at once and download from all of them concurrently
+            Returns {
+                "files": {camera name: path},
+                "session": the capture store session the files are recorded under,
+                "skew": seconds between the first and last camera being triggered,
+                "cameras": [{"camera", "port", "file", "fired_at", "trigger", "download",
+                             "error"}] per camera latency, in seconds
+            }
+            Raises a GPhoto2Error if any camera failed, after every camera has finished.
+        """
+        busy = [camera.name for camera in self.cameras if not camera.is_ready()]
+        if busy:
+            raise Exception(f"Cameras {busy} are currently busy, please wait until is_ready()")
+        for camera in self.cameras:
+            camera._state.ready = False
+
+        results = [None] * len(self.cameras)
+        session = f"{self.name}-{datetime.now().strftime('%Y%m%d-%Hh%Mm%Ss-%f')}"
+        barrier = threading.Barrier(len(self.cameras))
+        deadline = time.monotonic() + timeout
+        threads = [threading.Thread(target=self._fire,
+                                    args=(i, barrier, results, session, deadline),
+                                    name=f"{self.name}-{camera.name}", daemon=True)
+                   for i, camera in enumerate(self.cameras)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        barrier.abort()  # A camera that is still opening its session mustn't fire late
+
+        fired = [result["fired_at"] for result in results if result and "fired_at" in result]
+        self.last_skew = max(fired) - min(fired) if fired else None
+
+        failed = {camera.name: "Timed out" if result is None or not result["file"]
+                  and not result["error"] else result["error"]
+                  for camera, result in zip(self.cameras, results)
+                  if result is None or not result["file"]}
+        if failed:
+            raise GPhoto2Error(f"Group capture failed. Errors: {failed}")
+
+        return {
+            "files": {result["camera"]: result["file"] for result in results},
+            "session": session,
+            "skew": self.last_skew,
+            "cameras": results
+        }
+
+    def close(self):
+        for camera in self.cameras:
+            camera.close()
+        return True
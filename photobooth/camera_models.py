@@ -0,0 +1,147 @@
+"""
+Resolve a partial or misspelled camera model to a gphoto2 supported model
+
+    index = ModelIndex(supported_camera_list())
+    index.resolve("eos 1100d")  # "Canon EOS 1100D"
+    index.resolve("EOS")  # ValueError, too many models match as well as each other
+    index.search("canon 110d", k=3)  # [("Canon EOS 1100D", 0.567), ...] best first
+
+Models are normalized to lowercase alphanumeric tokens ("Canon EOS-1100D" ->
+["canon", "eos", "1100d"]) and indexed by character trigram. A query only scores
+the models that share the most trigrams with it, so resolving is fast even against
+the thousands of models gphoto2 supports.
+"""
+import collections
+import re
+
+# Models scoring below this aren't accepted as a match by resolve()
+MIN_MODEL_SCORE = 0.65
+
+# A fuzzy match is only accepted by resolve() if it beats the next best by this much,
+# so a vague ("EOS") or mistyped ("EOS 11D") model isn't taken as some other body
+MIN_MODEL_MARGIN = 0.1
+
+DEFAULT_SUGGESTIONS = 5
+
+# Only this many models (by shared trigrams) are fully scored per search
+MAX_CANDIDATES = 64
+
+# Trigrams in more than this fraction of models ("can", "eos") don't pick candidates,
+# unless the query has nothing rarer
+COMMON_TRIGRAM = 0.05
+
+# Score of a query token that is equal to, starts, or is inside a model token
+TOKEN_EQUAL = 1.0
+TOKEN_PREFIX = 0.8
+TOKEN_INSIDE = 0.5
+
+
+def model_tokens(model: str) -> list:
+    """ Lowercase alphanumeric tokens of a model name
+    """
+    return re.findall(r"[a-z0-9]+", model.lower())
+
+
+def trigrams(text: str) -> set:
+    """ Character trigrams of text, padded so short strings still have some
+    """
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ModelIndex():
+    """ Token and trigram index of camera models, for ranked fuzzy lookups
+        Ties are broken by the shorter model, then alphabetically, so results are deterministic.
+    """
+    def __init__(self, models: list):
+        self.models = list(models)
+        self._exact = dict()  # normalized name: model index
+        self._tokens = list()
+        self._trigrams = list()
+        self._postings = collections.defaultdict(list)  # trigram: [model index]
+
+        for i, model in enumerate(self.models):
+            tokens = model_tokens(model)
+            self._exact.setdefault(" ".join(tokens), i)
+            self._tokens.append(tokens)
+            grams = trigrams(" ".join(tokens))
+            self._trigrams.append(grams)
+            for gram in grams:
+                self._postings[gram].append(i)
+
+    def __len__(self):
+        return len(self.models)
+
+    def _score(self, query_tokens: list, query_grams: set, i: int) -> float:
+        """ 0.0-1.0, how well the query tokens match the model tokens, blended with the
+            trigram similarity (Dice) of the whole names, which catches typos
+        """
+        tokens = self._tokens[i]
+        token_score = 0.0
+        for query_token in query_tokens:
+            best = 0.0
+            for token in tokens:
+                if token == query_token:
+                    best = TOKEN_EQUAL
+                    break
+                elif token.startswith(query_token):
+                    best = max(best, TOKEN_PREFIX)
+                elif query_token in token:
+                    best = max(best, TOKEN_INSIDE)
+            token_score += best
+        token_score /= len(query_tokens)
+
+        grams = self._trigrams[i]
+        dice = 2.0 * len(query_grams & grams) / (len(query_grams) + len(grams))
+        return (0.6 * token_score) + (0.4 * dice)
+
+    def search(self, query: str, k: int = DEFAULT_SUGGESTIONS) -> list:
+        """ The k best matches for query, as [(model, score)] best first
+        """
+        query_tokens = model_tokens(query)
+        if not query_tokens:
+            return list()
+
+        normalized = " ".join(query_tokens)
+        if normalized in self._exact:
+            i = self._exact[normalized]
+            return [(self.models[i], 1.0)]
+
+        # Only score the models that share the most (uncommon) trigrams with the query
+        query_grams = trigrams(normalized)
+        postings = [self._postings[gram] for gram in query_grams if gram in self._postings]
+        common = max(MAX_CANDIDATES, COMMON_TRIGRAM * len(self.models))
+        rare = [p for p in postings if len(p) <= common]
+        shared = collections.Counter()
+        for posting in (rare or postings):
+            shared.update(posting)
+        candidates = [i for i, count in shared.most_common(MAX_CANDIDATES)]
+
+        scored = [(self._score(query_tokens, query_grams, i), i) for i in candidates]
+        scored.sort(key=lambda s: (-s[0], len(self.models[s[1]]), self.models[s[1]]))
+        return [(self.models[i], round(score, 3)) for score, i in scored[:k]]
+
+    def resolve(self, query: str, min_score: float = MIN_MODEL_SCORE,
+                margin: float = MIN_MODEL_MARGIN) -> str:
+        """ The model query names (ignoring case and punctuation), or the best fuzzy match
+            Raises a ValueError listing the closest models if nothing scores min_score, or
+            the best match doesn't beat the next best by margin
+        """
+        matches = self.search(query)
+        ambiguous = False
+        if matches and matches[0][1] >= min_score:
+            runner_up = matches[1][1] if len(matches) > 1 else 0.0
+            if round(matches[0][1] - runner_up, 3) >= margin:
+                return matches[0][0]
+            ambiguous = True
+
+        # Leave out anything that only shares a few letters
+        matches = [(model, score) for model, score in matches if score >= min_score / 2]
+        suggestions = "\n".join(f"  {model}" for model, score in matches)
+        raise ValueError(f"Provided model ({query}) "
+                         + ("matches more than one supported model. " if ambiguous
+                            else "not in supported list. ")
+                         + (f"Did you mean one of:\n{suggestions}\n" if matches else "")
+                         + "Please check the list of supported camera models via:\n"
+                         "from photobooth.camera import supported_camera_list\n"
+                         "supported_camera_list()")
@@ -0,0 +1,225 @@
+"""
+Layer compositing for LED panels
+
+Several effects can share one panel by each rendering into their own layer.
+Layers are stacked by z (lowest first) and blended into a single frame per tick.
+
+    compositor = Compositor(rows=8, cols=32)
+    compositor.add_layer(SolidLayer(BLUE, z=0, opacity=0.25))  # background
+    compositor.add_layer(TextLayer(bitmap, cols=32, z=1, count=None))  # scrolling text
+    frame = compositor.compose()
+"""
+import time
+import numpy
+
+from random import randint
+
+DEFAULT_SPEED = 0.01
+
+
+class Layer():
+    """ Base class for a compositor layer
+        Subclasses implement render(t, rows, cols), returning (rgb, alpha)
+          rgb: (rows, cols, 3) uint8 array
+          alpha: (rows, cols) float array of 0.0-1.0, or None for fully opaque
+        t is the number of seconds since the layer was added.
+        duration is in seconds, None for layers that run until removed.
+    """
+    def __init__(self, name: str = None, z: int = 0, opacity: float = 1.0,
+                 duration: float = None):
+        if not name:
+            # Forces a unique name
+            name = f"{type(self).__name__.lower()}-{id(self)}"
+        self.name = name
+        self.z = z
+        self.opacity = opacity
+        self.duration = duration
+        self.visible = True
+        self.start = None
+
+    def render(self, t: float, rows: int, cols: int):
+        raise NotImplementedError
+
+    def is_done(self, t: float) -> bool:
+        return self.duration is not None and t >= self.duration
+
+
+class SolidLayer(Layer):
+    """ Fills the panel with a single color
+    """
+    def __init__(self, color: tuple, **kwargs):
+        Layer.__init__(self, **kwargs)
+        self.color = color[:3]
+
+    def render(self, t, rows, cols):
+        rgb = numpy.empty((rows, cols, 3), dtype=numpy.uint8)
+        rgb[:] = self.color
+        return rgb, None
+
+
+class FrameLayer(Layer):
+    """ A static frame, lit pixels are opaque and OFF pixels are transparent
+        unless an alpha array is provided
+    """
+    def __init__(self, frame: numpy.ndarray, alpha: numpy.ndarray = None, **kwargs):
+        Layer.__init__(self, **kwargs)
+        self.frame = frame
+        self.alpha = alpha if alpha is not None else frame.any(axis=2).astype(numpy.float32)
+
+    def render(self, t, rows, cols):
+        return self.frame, self.alpha
+
+
+class FunctionLayer(Layer):
+    """ Calls func(t, rows, cols) for each frame, func returns (rows, cols, 3) rgb
+    """
+    def __init__(self, func, **kwargs):
+        Layer.__init__(self, **kwargs)
+        self.func = func
+
+    def render(self, t, rows, cols):
+        return self.func(t, rows, cols), None
+
+
+class TextLayer(Layer):
+    """ Scrolls a text bitmap (see neopixel.cached_text_bitmap) across the panel
+        cols is the panel width the bitmap was padded for
+        speed is seconds per column, count is the number of times to scroll (None = forever)
+        Unlit pixels are transparent, so layers below show through.
+    """
+    def __init__(self, bitmap: numpy.ndarray, cols: int, speed: float = DEFAULT_SPEED,
+                 count: int = 1, **kwargs):
+        self.bitmap = bitmap
+        self.mask = bitmap.any(axis=2).astype(numpy.float32)
+        self.speed = speed
+        self.count = count
+
+        duration = None
+        if count is not None:
+            # Bitmaps are padded with a panel width each side, see neopixel.render_text()
+            duration = count * (bitmap.shape[1] - cols) * speed
+        Layer.__init__(self, duration=duration, **kwargs)
+
+    def render(self, t, rows, cols):
+        positions = self.bitmap.shape[1] - cols + 1
+        x = int(t / self.speed) % positions if self.speed else 0
+        return self.bitmap[:rows, x:x + cols], self.mask[:rows, x:x + cols]
+
+
+class PaletteLayer(Layer):
+    """ Cycles a palette LUT (see photobooth.palette) across the columns of the panel
+        speed is seconds per palette step
+    """
+    def __init__(self, lut: numpy.ndarray, speed: float = DEFAULT_SPEED, **kwargs):
+        Layer.__init__(self, **kwargs)
+        self.lut = lut
+        self.speed = speed
+        self._positions = None
+
+    def render(self, t, rows, cols):
+        if self._positions is None or self._positions.shape != (rows, cols):
+            # Palette position of every pixel, spread across the columns
+            column = numpy.arange(cols) * len(self.lut) // cols
+            self._positions = numpy.broadcast_to(column, (rows, cols))
+        shift = int(t / self.speed) if self.speed else 0
+        return self.lut[(self._positions + shift) % len(self.lut)], None
+
+
+class TwinkleLayer(Layer):
+    """ Randomly selects a pixel, and flashes it with a random color
+        Each twinkle ramps up and down over 9 steps of wait seconds.
+    """
+    LEVELS = [i / 5.0 for i in range(1, 5)] + [i / 5.0 for i in range(5, 0, -1)]
+
+    def __init__(self, colors: list, wait: float = DEFAULT_SPEED, count: int = None,
+                 **kwargs):
+        duration = count * len(self.LEVELS) * wait if count is not None else None
+        Layer.__init__(self, duration=duration, **kwargs)
+        self.colors = colors
+        self.wait = wait
+        self._current = (None, None, None)
+
+    def render(self, t, rows, cols):
+        n, step = divmod(int(t / self.wait) if self.wait else 0, len(self.LEVELS))
+        twinkle, x, y = self._current
+        if twinkle != n:
+            # Pick a new pixel, never the same one twice in a row
+            last = (x, y)
+            while (x, y) == last:
+                x, y = randint(0, cols - 1), randint(0, rows - 1)
+            self._current = (n, x, y)
+            self._color = self.colors[randint(0, len(self.colors) - 1)]
+
+        rgb = numpy.zeros((rows, cols, 3), dtype=numpy.uint8)
+        alpha = numpy.zeros((rows, cols), dtype=numpy.float32)
+        rgb[y, x] = self._color[:3]
+        alpha[y, x] = self.LEVELS[step]
+        return rgb, alpha
+
+
+class Compositor():
+    """ Holds z ordered layers and blends them into a single frame
+    """
+    def __init__(self, rows: int, cols: int, clock=time.monotonic):
+        self.rows = rows
+        self.cols = cols
+        self.layers = list()
+        self._clock = clock
+
+    def add_layer(self, layer: Layer) -> Layer:
+        """ Add a layer, replacing any existing layer with the same name
+        """
+        self.remove_layer(layer.name)
+        layer.start = self._clock()
+        self.layers.append(layer)
+        # Stable sort, layers with the same z keep the order they were added in
+        self.layers.sort(key=lambda layer: layer.z)
+        return layer
+
+    def remove_layer(self, name: str) -> bool:
+        before = len(self.layers)
+        self.layers = [layer for layer in self.layers if layer.name != name]
+        return len(self.layers) != before
+
+    def get_layer(self, name: str) -> Layer:
+        for layer in self.layers:
+            if layer.name == name:
+                return layer
+        return None
+
+    def clear(self):
+        self.layers = list()
+        return True
+
+    def pending(self) -> bool:
+        """ True if any layer with a duration is still running
+            Layers without a duration (backgrounds, attract loops) don't count.
+        """
+        return any(layer.duration is not None for layer in self.layers)
+
+    def compose(self, now: float = None) -> numpy.ndarray:
+        """ Render every visible layer and blend them into a (rows, cols, 3) uint8 frame
+            Finished layers are removed.
+        """
+        now = self._clock() if now is None else now
+        rows, cols = self.rows, self.cols
+
+        self.layers = [layer for layer in self.layers if not layer.is_done(now - layer.start)]
+        layers = [layer for layer in self.layers if layer.visible and layer.opacity > 0]
+        if not layers:
+            return numpy.zeros((rows, cols, 3), dtype=numpy.uint8)
+
+        rgb = numpy.empty((len(layers), rows, cols, 3), dtype=numpy.float32)
+        alpha = numpy.empty((len(layers), rows, cols, 1), dtype=numpy.float32)
+        for i, layer in enumerate(layers):
+            layer_rgb, layer_alpha = layer.render(now - layer.start, rows, cols)
+            rgb[i] = layer_rgb
+            alpha[i, ..., 0] = layer.opacity if layer_alpha is None \
+                else layer_alpha * layer.opacity
+
+        # Alpha "over" blending for all layers at once:
+        # each layer is weighted by its alpha, times how much every layer above lets through
+        through = numpy.cumprod((1.0 - alpha)[::-1], axis=0)[::-1]
+        weights = alpha.copy()
+        weights[:-1] *= through[1:]
+        return (weights * rgb).sum(axis=0).astype(numpy.uint8)
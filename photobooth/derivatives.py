@@ -0,0 +1,166 @@
+"""
+Smaller versions (derivatives) of captures for the screen, galleries and the printer
+
+Full size captures are 18MP+ JPEGs, which are slow for the kiosk browser to decode
+and far more than a receipt printer can use. Each capture is decoded once, at a
+reduced scale using PIL's draft() mode, and every derivative is made from that.
+
+Derivatives are stored by the content hash of the capture, so they are only made
+once, however many times (or from wherever) a capture is asked for:
+    {cache_dir}/ab/ab12...ef-display-1920x1080.jpg
+
+    derivatives = DerivativeCache()
+    future = derivatives.submit(pic)  # Renders in the pool
+    future.result()["display"]  # path to the 1920x1080 version
+"""
+import hashlib
+import math
+import os
+import threading
+
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import current_process
+
+from PIL import Image
+
+DEFAULT_DERIVATIVE_DIR = "/opt/captures/derivatives"
+
+# size is the box the derivative fits within, keeping the aspect ratio
+DEFAULT_DERIVATIVES = {
+    "display": {"size": (1920, 1080), "mode": "RGB", "quality": 85},
+    "thumb": {"size": (320, 240), "mode": "RGB", "quality": 75},
+    # 576 dots is the width of an 80mm receipt printer head
+    "print": {"size": (576, 4096), "mode": "L", "quality": 90},
+}
+
+DEFAULT_WORKERS = 2
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    """ sha1 of a file's contents
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def draft_size(source: tuple, boxes: list) -> tuple:
+    """ The size to ask draft() for: source scaled down just enough to cover each box once
+        the derivative is fitted to it (keeping source's aspect ratio)
+    """
+    width, height = source
+    scale = max(min(box[0] / width, box[1] / height, 1.0) for box in boxes)
+    return max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))
+
+
+def render_derivatives(path: str, targets: dict, existing: dict = None) -> dict:
+    """ Make every derivative in targets ({name: (target path, spec)}) from one decode of path
+        Returns {name: target path}, including the existing ({name: target path}) derivatives
+        Runs in the worker pool, so it only takes and returns picklable values.
+    """
+    # Decode at the smallest JPEG scale that still covers the largest derivative
+    with Image.open(path) as image:
+        image.draft('RGB', draft_size(image.size, [spec["size"] for _, spec in targets.values()]))
+        base = image.convert('RGB')
+
+    results = dict(existing) if existing else dict()
+    for name, (target, spec) in targets.items():
+        image = base.convert(spec["mode"]) if spec["mode"] != base.mode else base.copy()
+        image.thumbnail(spec["size"], Image.BILINEAR)
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}-{threading.get_ident()}.tmp"
+        image.save(tmp, 'JPEG', quality=spec["quality"])
+        os.replace(tmp, target)
+        results[name] = target
+    return results
+
+
+class DerivativeCache():
+    """ Makes and stores derivatives of captures in a content addressed cache dir
+        Work is done in a process pool. Daemonic processes (like a booth Worker) can't
+        start child processes, so inside one a thread pool is used instead, PIL releases
+        the GIL while decoding and resizing.
+    """
+    def __init__(self, cache_dir: str = DEFAULT_DERIVATIVE_DIR, derivatives: dict = None,
+                 workers: int = DEFAULT_WORKERS):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.derivatives = derivatives if derivatives else DEFAULT_DERIVATIVES
+        self.workers = workers
+        self.pool = None
+        self.pid = None  # The process that started the pool
+        self._pending = dict()  # digest: Future, so a capture is only rendered once at a time
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        if self.pool is None or self.pid != os.getpid():
+            # Pools don't survive a fork, each process gets its own
+            if current_process().daemon:
+                self.pool = ThreadPoolExecutor(max_workers=self.workers)
+            else:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            self.pid = os.getpid()
+            self._pending = dict()
+        return self.pool
+
+    def path_for(self, digest: str, name: str) -> str:
+        """ Cache path of a derivative, the spec is in the name so changing it makes a new file
+        """
+        spec = self.derivatives[name]
+        width, height = spec["size"]
+        mode = "-gray" if spec["mode"] == "L" else ""
+        return os.path.join(self.cache_dir, digest[:2],
+                            f"{digest}-{name}-{width}x{height}{mode}.jpg")
+
+    def paths(self, path: str) -> dict:
+        """ {name: cache path} of every derivative of path, whether it has been made or not
+        """
+        digest = file_digest(path)
+        return {name: self.path_for(digest, name) for name in self.derivatives}
+
+    def submit(self, path: str):
+        """ Make any missing derivatives of path in the pool
+            Returns a Future of {name: path}, which is already done if nothing was missing
+        """
+        digest = file_digest(path)
+        paths = {name: self.path_for(digest, name) for name in self.derivatives}
+        missing = {name: (target, self.derivatives[name]) for name, target in paths.items()
+                   if not os.path.exists(target)}
+
+        with self._lock:
+            pool = self._get_pool()
+            self._pending = {d: f for d, f in self._pending.items() if not f.done()}
+            if digest in self._pending and not self._pending[digest].done():
+                return self._pending[digest]
+            if not missing:
+                future = Future()
+                future.set_result(paths)
+                return future
+
+            existing = {name: target for name, target in paths.items() if name not in missing}
+            future = pool.submit(render_derivatives, path, missing, existing)
+            self._pending[digest] = future
+        return future
+
+    def generate(self, path: str, timeout: float = None) -> dict:
+        """ Make any missing derivatives of path and wait for them, returns {name: path}
+        """
+        return self.submit(path).result(timeout=timeout)
+
+    def get(self, path: str, name: str = "display", timeout: float = None) -> str:
+        """ Path to one derivative of path, making it if needed
+        """
+        if name not in self.derivatives:
+            raise ValueError(f"The derivative: {name} is not supported. "
+                             f"Please use one of {list(self.derivatives)}")
+        return self.generate(path, timeout=timeout)[name]
+
+    def close(self, wait: bool = True):
+        if self.pool is not None and self.pid == os.getpid():
+            self.pool.shutdown(wait=wait)
+        self.pool = None
+        return True
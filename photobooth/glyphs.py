@@ -0,0 +1,266 @@
+"""
+Glyph atlas for the bundled LED fonts in ./resources
+
+Each glyph of a font is rasterized once with PIL, packed into a bitmap of columns
+and saved to a cache file. Later loads mmap that file, so rendering a string is
+just copying glyph columns into place instead of a PIL round trip.
+
+Glyphs are placed like PIL places them: each one at the pen position plus its left
+bearing, then the pen moves on by its advance. A glyph's ink can reach past its
+advance (or left of the pen), so neighbours are OR'd together rather than butted up.
+FreeType's hinting also nudges the pen by a pixel between some pairs of glyphs, which
+PIL doesn't expose, so those nudges are measured once per pair when the atlas is built.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import numpy
+
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+
+ABSPATH = os.path.dirname(__file__)
+RESOURCES = os.path.join(ABSPATH, 'resources')
+
+DEFAULT_FONT = "Apple_II_mod.ttf"
+DEFAULT_FONT_PT = 8
+
+DEFAULT_ATLAS_DIR = "~/.cache/photobooth/glyphs"
+
+# Printable ASCII, anything else is rendered with PIL
+ATLAS_CHARSET = "".join(chr(c) for c in range(32, 127))
+
+# magic, version, rows, glyph count, total columns
+ATLAS_HEADER = struct.Struct("<4sHHHI")
+ATLAS_MAGIC = b"PBGA"
+ATLAS_VERSION = 2
+
+
+def font_path(font_name: str = DEFAULT_FONT) -> str:
+    """ Resolve a font name to a file in ./resources
+    """
+    if not font_name.endswith('.ttf'):
+        font_name = f'{font_name}.ttf'
+
+    path = f"{RESOURCES}/{font_name}"
+    if not os.path.exists(path):
+        raise ValueError(
+            f"The font: '{font_name}' could not be found, please try a font in ./resources")
+    return path
+
+
+@lru_cache(maxsize=None)
+def load_font(font_name: str = DEFAULT_FONT, font_pt: int = DEFAULT_FONT_PT):
+    """ Load a font from ./resources, only reading the TTF the first time it is asked for
+    """
+    return ImageFont.truetype(font_path(font_name), font_pt)
+
+
+def rasterize(font_name: str, font_pt: int, rows: int,
+              charset: str = ATLAS_CHARSET) -> tuple:
+    """ Draw every glyph in charset with PIL
+        Returns (advances, bearings, widths, columns, kerning): per glyph how far the pen
+        moves, where the glyph's columns start relative to the pen, and how many there
+        are. columns is a (rows, total width) bool array of every glyph side by side, in
+        charset order. See measure_kerning()
+    """
+    font = load_font(font_name, font_pt)
+
+    advances = list()
+    bearings = list()
+    widths = list()
+    glyphs = list()
+    for char in charset:
+        left, top, right, bottom = font.getbbox(char)
+        advance = int(round(font.getlength(char)))
+        width = max(0, right - left)
+        # Matches render_text() in neopixel.py, 'P' mode disables anti-aliasing
+        image = Image.new('P', (width, rows), 0)
+        ImageDraw.Draw(image).text((-left, 0), char, font=font, fill=255)
+        advances.append(advance)
+        bearings.append(left)
+        widths.append(width)
+        glyphs.append(numpy.asarray(image) == 255)
+
+    return (numpy.array(advances, dtype=numpy.uint16), numpy.array(bearings, dtype=numpy.int16),
+            numpy.array(widths, dtype=numpy.uint16), numpy.concatenate(glyphs, axis=1),
+            measure_kerning(font, advances, charset))
+
+
+def ink_right(font, text: str) -> int:
+    """ The column after the rightmost ink of text, relative to the pen start
+    """
+    mask, offset = font.getmask2(text, mode='1')
+    bbox = mask.getbbox()
+    return offset[0] + bbox[2] if bbox else 0
+
+
+def measure_kerning(font, advances: list, charset: str = ATLAS_CHARSET,
+                    probe: str = "H") -> numpy.ndarray:
+    """ Pixels the pen moves, on top of the advance, from each glyph to the next
+        A (count, count) int8 array indexed [previous, next]. Each pair is drawn in front of
+        probe, and where the probe lands is compared to where it lands after next alone.
+        Every pair is drawn, so this is the slow part of building an atlas.
+    """
+    after = [ink_right(font, char + probe) for char in charset]
+    kerning = numpy.zeros((len(charset), len(charset)), dtype=numpy.int8)
+    for i, previous in enumerate(charset):
+        for j, char in enumerate(charset):
+            kerning[i, j] = ink_right(font, previous + char + probe) - after[j] - advances[i]
+    return kerning
+
+
+class GlyphAtlas():
+    """ Every glyph of a font at a given size, packed side by side as columns
+        Use compose() to build the bitmap for a string.
+    """
+    def __init__(self, advances: numpy.ndarray, bearings: numpy.ndarray,
+                 widths: numpy.ndarray, columns: numpy.ndarray, kerning: numpy.ndarray,
+                 charset: str = ATLAS_CHARSET):
+        self.charset = charset
+        self.rows = columns.shape[0]
+        self.advances = advances
+        self.bearings = bearings
+        self.widths = widths
+        self.columns = columns
+        self.columns.flags.writeable = False
+        self.kerning = kerning
+
+        # (index, advance, bearing, glyph columns) for each character
+        offsets = numpy.concatenate(([0], numpy.cumsum(widths, dtype=numpy.intp)[:-1]))
+        self._glyphs = {
+            char: (i, int(advance), int(bearing), self.columns[:, offset:offset + width])
+            for i, (char, advance, bearing, offset, width)
+            in enumerate(zip(charset, advances, bearings, offsets, widths))}
+
+    @classmethod
+    def from_font(cls, font_name: str = DEFAULT_FONT, font_pt: int = DEFAULT_FONT_PT,
+                  rows: int = 8):
+        """ Rasterize a font into a new atlas
+        """
+        return cls(*rasterize(font_name, font_pt, rows))
+
+    @classmethod
+    def load(cls, path: str):
+        """ Load an atlas written by save() using mmap
+        """
+        with open(path, 'rb') as fh:
+            buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, rows, count, total = ATLAS_HEADER.unpack_from(buf)
+        if magic != ATLAS_MAGIC or version != ATLAS_VERSION:
+            raise ValueError(f"{path} is not a version {ATLAS_VERSION} glyph atlas")
+
+        offset = ATLAS_HEADER.size
+        charset = buf[offset:offset + count].decode('ascii')
+        offset += count
+        advances = numpy.frombuffer(buf, dtype='<u2', count=count, offset=offset).copy()
+        offset += advances.nbytes
+        bearings = numpy.frombuffer(buf, dtype='<i2', count=count, offset=offset).copy()
+        offset += bearings.nbytes
+        widths = numpy.frombuffer(buf, dtype='<u2', count=count, offset=offset).copy()
+        offset += widths.nbytes
+        kerning = numpy.frombuffer(buf, dtype=numpy.int8, count=count * count,
+                                   offset=offset).reshape(count, count).copy()
+        offset += kerning.nbytes
+        packed = numpy.frombuffer(buf, dtype=numpy.uint8, offset=offset)
+        # Columns are packed one bit per row, unpack once into a small bool array
+        columns = numpy.unpackbits(packed)[:rows * total].reshape(total, rows)
+        del packed
+        buf.close()
+
+        return cls(advances, bearings, widths, columns.T.astype(bool), kerning,
+                   charset=charset)
+
+    def save(self, path: str):
+        """ Write the atlas to disk: header, charset, advances, bearings, widths, kerning,
+            then the bit packed columns
+        """
+        total = self.columns.shape[1]
+        header = ATLAS_HEADER.pack(ATLAS_MAGIC, ATLAS_VERSION, self.rows,
+                                   len(self.charset), total)
+        packed = numpy.packbits(self.columns.T.ravel())
+
+        # Write to a temp file and rename, so a partial file is never loaded
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as fh:
+            fh.write(header)
+            fh.write(self.charset.encode('ascii'))
+            fh.write(self.advances.astype('<u2').tobytes())
+            fh.write(self.bearings.astype('<i2').tobytes())
+            fh.write(self.widths.astype('<u2').tobytes())
+            fh.write(self.kerning.astype(numpy.int8).tobytes())
+            fh.write(packed.tobytes())
+        os.replace(tmp, path)
+        return True
+
+    def supports(self, text: str) -> bool:
+        """ True if every character of text is in the atlas
+        """
+        return all(char in self._glyphs for char in text)
+
+    def width(self, text: str) -> int:
+        """ Width of text as PIL measures it (getsize()): the advances, or the end of the last
+            glyph if it reaches past its own
+        """
+        if not text:
+            return 0
+        pen = sum(self._glyphs[char][1] for char in text)
+        i, advance, bearing, glyph = self._glyphs[text[-1]]
+        return max(pen, pen - advance + bearing + glyph.shape[1])
+
+    def compose(self, text: str, pad: int = 0) -> numpy.ndarray:
+        """ Build a (rows, width) bool bitmap of text from the glyph columns
+            pad adds that many blank columns on each side (a panel width for scrolling)
+        """
+        bitmap = numpy.zeros((self.rows, self.width(text) + (pad * 2)), dtype=bool)
+        pen = pad
+        previous = None
+        for char in text:
+            i, advance, bearing, glyph = self._glyphs[char]
+            if previous is not None:
+                pen += int(self.kerning[previous, i])
+            # Ink outside the bitmap (a negative bearing without pad) is cut off, like PIL
+            start = pen + bearing
+            skip = max(0, -start)
+            end = min(start + glyph.shape[1], bitmap.shape[1])
+            if end > start + skip:
+                bitmap[:, start + skip:end] |= glyph[:, skip:end - start]
+            pen += advance
+            previous = i
+        return bitmap
+
+
+def atlas_path(font_name: str, font_pt: int, rows: int, atlas_dir: str = DEFAULT_ATLAS_DIR):
+    """ Cache file name for an atlas, tied to the font file contents so edits rebuild it
+    """
+    path = font_path(font_name)
+    with open(path, 'rb') as fh:
+        digest = hashlib.sha1(fh.read()).hexdigest()[:12]
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.expanduser(atlas_dir),
+                        f"{name}-{font_pt}pt-{rows}r-{digest}.atlas")
+
+
+@lru_cache(maxsize=None)
+def get_atlas(font_name: str = DEFAULT_FONT, font_pt: int = DEFAULT_FONT_PT, rows: int = 8,
+              atlas_dir: str = DEFAULT_ATLAS_DIR) -> GlyphAtlas:
+    """ Load the atlas for a font from the cache dir, building (and saving) it if needed
+    """
+    path = atlas_path(font_name, font_pt, rows, atlas_dir=atlas_dir)
+    if os.path.exists(path):
+        try:
+            return GlyphAtlas.load(path)
+        except (OSError, ValueError):
+            pass  # Corrupt or old, rebuild it below
+
+    atlas = GlyphAtlas.from_font(font_name, font_pt, rows)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atlas.save(path)
+    except OSError:
+        pass  # Not being able to cache to disk only costs a rebuild next start
+
+    return atlas
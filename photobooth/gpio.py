@@ -0,0 +1,240 @@
+"""
+Button events from GPIO edges, debounced in software
+
+Instead of polling input() in a loop, each button pin gets an edge callback. Edges are
+debounced and turned into events on a queue, so a press is seen as soon as it happens
+(and a press shorter than a poll interval isn't missed):
+    buttons = ButtonEvents(GPIO, debounce=0.02)
+    buttons.add("capture", 25)
+    event = buttons.get()  # {"label": "capture", "pin": 25, "pressed": True, "time": ...}
+
+SimulatedGPIO has the same interface as RPi.GPIO, with press() and inject() to make
+edges, for running a booth (or testing) without a Raspberry Pi.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+
+# Seconds a switch has to hold a level before another change counts
+DEFAULT_DEBOUNCE = 0.02
+
+# Button events kept before the oldest are dropped
+DEFAULT_EVENT_QUEUE = 64
+
+GPIO_BACKENDS = ["rpi", "simulated"]
+DEFAULT_GPIO_BACKEND = os.environ.get("PHOTOBOOTH_GPIO", "rpi")
+
+
+class SimulatedGPIO():
+    """ Stand in for the RPi.GPIO module, pins are values in memory
+        Callbacks registered with add_event_detect() are called (from the caller's
+        thread) by inject() when a pin changes level.
+    """
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    HIGH = 1
+    LOW = 0
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        self.mode = None
+        self.levels = dict()  # pin: 0 | 1
+        self.directions = dict()  # pin: IN | OUT
+        self.detects = dict()  # pin: (edge, [callbacks])
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        self.directions[pin] = direction
+        if initial is not None:
+            self.levels[pin] = int(bool(initial))
+        else:
+            self.levels.setdefault(pin, 1 if pull_up_down == self.PUD_UP else 0)
+
+    def output(self, pin, value):
+        self.levels[pin] = int(bool(value))
+
+    def input(self, pin):
+        return self.levels.get(pin, 0)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        if pin in self.detects:
+            raise RuntimeError(f"Conflicting edge detection already enabled for pin: {pin}")
+        self.detects[pin] = (edge, [callback] if callback else list())
+
+    def add_event_callback(self, pin, callback):
+        self.detects[pin][1].append(callback)
+
+    def remove_event_detect(self, pin):
+        self.detects.pop(pin, None)
+
+    def cleanup(self, pins=None):
+        for pin in ([pins] if isinstance(pins, int) else pins or list(self.levels)):
+            self.detects.pop(pin, None)
+            self.levels.pop(pin, None)
+            self.directions.pop(pin, None)
+
+    def inject(self, pin, value):
+        """ Set an input pin's level, calling its edge callbacks if that is an edge
+        """
+        value = int(bool(value))
+        previous = self.levels.get(pin, 0)
+        self.levels[pin] = value
+        if value == previous or pin not in self.detects:
+            return False
+        edge, callbacks = self.detects[pin]
+        if edge == self.BOTH or edge == (self.RISING if value else self.FALLING):
+            for callback in callbacks:
+                callback(pin)
+        return True
+
+    def press(self, pin, duration: float = 0.05, bounces: int = 0, bounce_time: float = 0.001):
+        """ Press and release a button, with optional contact bounce on each edge
+        """
+        for level in (1, 0):
+            for _ in range(bounces):
+                self.inject(pin, level)
+                time.sleep(bounce_time)
+                self.inject(pin, 1 - level)
+                time.sleep(bounce_time)
+            self.inject(pin, level)
+            if level:
+                time.sleep(duration)
+        return True
+
+
+def get_gpio_backend(backend: str = DEFAULT_GPIO_BACKEND):
+    """ The RPi.GPIO module, or a SimulatedGPIO
+    """
+    if backend == "simulated":
+        return SimulatedGPIO()
+    if backend == "rpi":
+        import RPi.GPIO as GPIO
+        return GPIO
+    raise ValueError(f"The GPIO backend: {backend} is not supported. "
+                     f"Please use one of {GPIO_BACKENDS}")
+
+
+class ButtonEvents():
+    """ Debounced button events from GPIO edge callbacks, delivered on a queue
+        A change of level is reported straight away, then the pin is ignored for debounce
+        seconds and read again, so bounce is dropped but a quick release isn't.
+    """
+    def __init__(self, gpio, debounce: float = DEFAULT_DEBOUNCE,
+                 maxsize: int = DEFAULT_EVENT_QUEUE):
+        self.gpio = gpio
+        self.debounce = debounce
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.labels = dict()  # pin: label
+        self._state = dict()  # pin: level last reported
+        self._changed = dict()  # pin: monotonic time of the last reported change
+        self._timers = dict()  # pin: Timer reading the pin again after the debounce
+        self._lock = threading.Lock()
+        self._listeners = list()  # (loop, asyncio.Queue)
+
+    def add(self, label: str, pin: int):
+        """ Start watching a pin for edges, it should already be set up as an input
+        """
+        self.labels[pin] = label
+        self._state[pin] = bool(self.gpio.input(pin))
+        self._changed[pin] = 0.0
+        self.gpio.add_event_detect(pin, self.gpio.BOTH, callback=self._edge)
+        return True
+
+    def remove(self, pin: int):
+        self.gpio.remove_event_detect(pin)
+        with self._lock:
+            timer = self._timers.pop(pin, None)
+            if timer:
+                timer.cancel()
+            self.labels.pop(pin, None)
+        return True
+
+    def _edge(self, pin):
+        """ GPIO callback, runs on the GPIO library's thread
+        """
+        now = time.monotonic()
+        with self._lock:
+            if pin not in self.labels:
+                return
+            settle = self._changed[pin] + self.debounce - now
+            if settle > 0:
+                # Bouncing, look again once it has had time to settle
+                if pin not in self._timers:
+                    timer = threading.Timer(settle, self._settled, args=(pin,))
+                    timer.daemon = True
+                    self._timers[pin] = timer
+                    timer.start()
+                return
+            self._report(pin, now)
+
+    def _settled(self, pin):
+        with self._lock:
+            self._timers.pop(pin, None)
+            if pin in self.labels:
+                self._report(pin, time.monotonic())
+
+    def _report(self, pin, now):
+        level = bool(self.gpio.input(pin))
+        if level == self._state[pin]:
+            return
+        self._state[pin] = level
+        self._changed[pin] = now
+        event = {"label": self.labels[pin], "pin": pin, "pressed": level, "time": now}
+        if self.queue.full():
+            self.queue.get_nowait()  # Drop the oldest, nobody is reading
+        self.queue.put_nowait(event)
+        for loop, stream in list(self._listeners):
+            loop.call_soon_threadsafe(stream.put_nowait, event)
+
+    def get(self, timeout: float = None, pressed: bool = None) -> dict:
+        """ The next event (only presses if pressed=True, releases if False), None on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                event = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if pressed is None or event["pressed"] == pressed:
+                return event
+
+    def clear(self):
+        """ Drop events nobody read, e.g. presses made while the booth was busy
+        """
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return True
+
+    async def stream(self):
+        """ Events as an async iterator, for use in an asyncio loop
+            async for event in buttons.stream(): ...
+        """
+        listener = (asyncio.get_running_loop(), asyncio.Queue())
+        self._listeners.append(listener)
+        try:
+            while True:
+                yield await listener[1].get()
+        finally:
+            self._listeners.remove(listener)
+
+    def close(self):
+        for pin in list(self.labels):
+            self.remove(pin)
+        return True
@@ -1,10 +1,17 @@
 import board
 import neopixel
+import numpy
 import time
 import os
 
+from functools import lru_cache
 from random import randint
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
+
+from photobooth.animation import DEFAULT_FPS, FrameScheduler
+from photobooth.compositor import Compositor, PaletteLayer, TextLayer, TwinkleLayer
+from photobooth.glyphs import DEFAULT_FONT, DEFAULT_FONT_PT, get_atlas, load_font
+from photobooth.palette import get_palette
 
 ABSPATH = os.path.dirname(__file__)
 RESOURCES = os.path.join(ABSPATH, 'resources')
@@ -23,6 +30,8 @@ OFF = (0, 0, 0)  # Not included in color lists
 COLOR_LIST = ["RED", "GREEN", "BLUE", "YELLOW", "PURPLE", "CYAN", "ORANGE", "PINK", "WHITE"]
 COLOR_TUPLE_LIST = [RED, GREEN, BLUE, YELLOW, PURPLE, CYAN, ORANGE, PINK, WHITE]
 
+RAINBOW = get_palette("rainbow")
+
 # The default brightness percent as a float (0.1 = 10%)
 DEFAULT_BRIGHTNESS = 0.1
 
@@ -31,28 +40,27 @@ DEAFULT_PIN = board.D18
 
 DEFAULT_SPEED = 0.01
 
+# Number of rendered messages kept in memory (attract loop, countdown, status, etc)
+TEXT_CACHE_SIZE = 32
+
+# How the strip snakes through the panel, and which corner pixel 0 (data in) sits at
+PANEL_LAYOUTS = ["serpentine", "column_major", "row_serpentine", "row_major"]
+PANEL_ORIGINS = ["top_left", "top_right", "bottom_left", "bottom_right"]
+
+DEFAULT_LAYOUT = "serpentine"
+DEFAULT_ORIGIN = "bottom_right"
+
 
 def wheel(np, pos):
     """ Input a value 0 to 255 to get a color value.
         The colours are a transition r - g - b - back to r.
         Source: Adafruit tutorials
+        Looked up from the 'rainbow' palette, see photobooth.palette
     """
     if pos < 0 or pos > 255:
         r = g = b = 0
-    elif pos < 85:
-        r = int(pos * 3)
-        g = int(255 - pos * 3)
-        b = 0
-    elif pos < 170:
-        pos -= 85
-        r = int(255 - pos * 3)
-        g = 0
-        b = int(pos * 3)
     else:
-        pos -= 170
-        r = 0
-        g = int(pos * 3)
-        b = int(255 - pos * 3)
+        r, g, b = RAINBOW[pos].tolist()
     return (r, g, b) if np.byteorder in (neopixel.RGB, neopixel.GRB) else (r, g, b, 0)
 
 
@@ -75,11 +83,77 @@ def getIndex(x, y, rows, cols):
          |    |    |    |
         255  240--xxx  000
     """
-    x = cols-x-1
-    if x % 2 != 0:
+    return layout_index(x, y, rows, cols, layout=DEFAULT_LAYOUT, origin=DEFAULT_ORIGIN)
+
+
+def layout_index(x, y, rows, cols, layout: str = DEFAULT_LAYOUT, origin: str = DEFAULT_ORIGIN):
+    """ Given a relative (x, y) coordinate, return the pixel index for a single panel
+        layout: how the strip is wired through the panel (see PANEL_LAYOUTS)
+          serpentine     - columns, alternating direction (common 8x32 panels)
+          column_major   - columns, every column in the same direction
+          row_serpentine - rows, alternating direction
+          row_major      - rows, every row in the same direction
+        origin: the corner where pixel 0 is found (see PANEL_ORIGINS)
+    """
+    if layout not in PANEL_LAYOUTS:
+        raise ValueError(f"Unknown panel layout: {layout}. Please use one of {PANEL_LAYOUTS}")
+    if origin not in PANEL_ORIGINS:
+        raise ValueError(f"Unknown panel origin: {origin}. Please use one of {PANEL_ORIGINS}")
+
+    # Flip the coordinates so that pixel 0 is always top left
+    if origin.endswith("right"):
+        x = cols-x-1
+    if origin.startswith("bottom"):
+        y = rows-y-1
+
+    if layout == "serpentine":
+        return (x*rows)+(y if x % 2 == 0 else rows-1-y)
+    elif layout == "column_major":
         return (x*rows)+y
+    elif layout == "row_serpentine":
+        return (y*cols)+(x if y % 2 == 0 else cols-1-x)
     else:
-        return (x*rows)+(rows-1-y)
+        return (y*cols)+x
+
+
+def build_pixel_map(rows, cols,
+                    layout: str = DEFAULT_LAYOUT,
+                    origin: str = DEFAULT_ORIGIN,
+                    tile_rows: int = None,
+                    tile_cols: int = None,
+                    tile_layout: str = "row_major",
+                    tile_origin: str = "top_left") -> list:
+    """ Build a lookup table of pixel indexes, so drawing is a lookup instead of math per pixel
+        Returns a list of rows, use as pixel_map[y][x]
+
+        For walls made of chained panels (tiles), provide tile_rows/tile_cols as the
+        size of a single tile. Each tile is wired according to layout/origin, and the
+        tiles themselves are chained according to tile_layout/tile_origin.
+    """
+    tile_rows = tile_rows or rows
+    tile_cols = tile_cols or cols
+
+    if rows % tile_rows or cols % tile_cols:
+        raise ValueError(f"A {rows}x{cols} panel can't be evenly split into "
+                         f"{tile_rows}x{tile_cols} tiles")
+
+    tiles_down = rows // tile_rows
+    tiles_across = cols // tile_cols
+    tile_px = tile_rows * tile_cols
+
+    pixel_map = list()
+    for y in range(rows):
+        ty, ly = divmod(y, tile_rows)
+        row = list()
+        for x in range(cols):
+            tx, lx = divmod(x, tile_cols)
+            tile = layout_index(tx, ty, tiles_down, tiles_across,
+                                layout=tile_layout, origin=tile_origin)
+            row.append((tile*tile_px)+layout_index(lx, ly, tile_rows, tile_cols,
+                                                   layout=layout, origin=origin))
+        pixel_map.append(row)
+
+    return pixel_map
 
 
 def valid_color_tuple(rgb_tuple, fix=False) -> (bool, tuple):
@@ -110,6 +184,64 @@ def valid_color_tuple(rgb_tuple, fix=False) -> (bool, tuple):
         return False, tuple(rgb_list)
 
 
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(text: str, rows: int, cols: int, x_offset: int = 0,
+                font_name: str = DEFAULT_FONT, font_pt: int = DEFAULT_FONT_PT) -> Image.Image:
+    """ Using PIL, draw text into an image to be scrolled
+        The image is padded with a panel width of blank space on both sides.
+        Results are cached, so treat the returned image as read only.
+    """
+    if rows < 5:
+        raise ValueError(
+            f"Unable to scroll text on a board with rows < 5 px. Board Rows: {rows} ")
+
+    font = load_font(font_name, font_pt)
+    text_width, text_height = font.getsize(text)
+
+    # FIXME :
+    # For some reason we need to remove 1 px from the image width
+    # for it to clear smoothly at the end
+    # Instead of messing with the math, a workaround of clearing the panel
+    # after the scroll was added
+    image = Image.new('P', (text_width + (cols * 2), rows), 0)
+    draw = ImageDraw.Draw(image)
+
+    draw.text((cols, x_offset), text, font=font, fill=255)
+
+    return image
+
+
+def text_bitmap(text, rows: int, cols: int, color: tuple = WHITE) -> numpy.ndarray:
+    """ Convert a text image (see render_text) or bool mask into a (rows, width, 3) RGB array
+        Each scroll frame is a column slice of this array: bitmap[:, x:x + cols]
+    """
+    if isinstance(text, numpy.ndarray):
+        mask = text[:rows]
+    else:
+        mask = numpy.asarray(text)[:rows] == 255
+    bitmap = numpy.zeros(mask.shape + (3,), dtype=numpy.uint8)
+    bitmap[mask] = color[:3]
+    return bitmap
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def cached_text_bitmap(text: str, rows: int, cols: int, color: tuple = WHITE,
+                       font_name: str = DEFAULT_FONT,
+                       font_pt: int = DEFAULT_FONT_PT) -> numpy.ndarray:
+    """ Rendered and colored text_bitmap(), cached by (text, panel size, color, font, pt)
+        The returned array is read only since it is shared between callers.
+    """
+    atlas = get_atlas(font_name, font_pt, rows)
+    if atlas.supports(text):
+        # Glyph columns from the atlas, padded the same as render_text()
+        bitmap = text_bitmap(atlas.compose(text, pad=cols), rows, cols, color=color)
+    else:
+        image = render_text(text, rows, cols, font_name=font_name, font_pt=font_pt)
+        bitmap = text_bitmap(image, rows, cols, color=color)
+    bitmap.flags.writeable = False
+    return bitmap
+
+
 class Neopixel():
     """ Loads a 'neopixel' for use.
         Neopixel is typically a 5050 pixel (RGB)
@@ -123,6 +255,11 @@ class Neopixel():
                  brightness: float = DEFAULT_BRIGHTNESS,
                  pixel_order: str = DEAFULT_ORDER,
                  auto_write=False,
+                 layout: str = DEFAULT_LAYOUT,
+                 origin: str = DEFAULT_ORIGIN,
+                 tile_rows: int = None,
+                 tile_cols: int = None,
+                 fps: float = DEFAULT_FPS,
                  **kwargs):
 
         if not name:
@@ -138,6 +275,10 @@ class Neopixel():
         self.inputs = locals()
         self.num_px = rows * cols
 
+        # (x, y) -> pixel index lookup, built once. Use as self.pixel_map[y][x]
+        self.pixel_map = build_pixel_map(rows, cols, layout=layout, origin=origin,
+                                         tile_rows=tile_rows, tile_cols=tile_cols)
+
         # board_pin = getattr(board, f"D{pin}")
 
         # Init
@@ -145,18 +286,98 @@ class Neopixel():
             control, self.num_px, brightness=brightness, pixel_order=pixel_order,
             auto_write=auto_write, **kwargs)
 
+        # Frame buffer. Animations render into self.frame (rows, cols, RGB)
+        # and push it to the strip with show_frame()
+        self.frame = numpy.zeros((rows, cols, 3), dtype=numpy.uint8)
+        self._strip_index = numpy.array(self.pixel_map, dtype=numpy.intp)
+        self._strip_pixels = numpy.zeros((self.num_px, 3), dtype=numpy.uint8)
+        self._brightness_lut = (None, None)
+
+        # Paces animations on a monotonic clock, see frame_stats()
+        self.scheduler = FrameScheduler(fps=fps)
+
+        # Layers that are blended together by play(), so effects can share the panel
+        self.compositor = Compositor(rows, cols)
+
+        if rows >= 5:
+            # Load the glyph atlas for the default font now, rather than on the first scroll
+            get_atlas(DEFAULT_FONT, DEFAULT_FONT_PT, rows)
+
         # TODO: Add logic that verifies the panel is working
 
-    def rainbow_cycle(self, wait_ms=1, iterations=1):
+    def _get_brightness_lut(self, brightness: float) -> numpy.ndarray:
+        """ 256 entry table of channel values scaled by brightness, rebuilt when brightness changes
+        """
+        cached, lut = self._brightness_lut
+        if cached != brightness:
+            # int() truncation to match NeoPixel().__setitem__()
+            lut = (numpy.arange(256) * brightness).astype(numpy.uint8)
+            self._brightness_lut = (brightness, lut)
+        return lut
+
+    def write_strip(self, pixels: numpy.ndarray, show: bool = True, brightness: float = None):
+        """ Push an array of (num_px, 3) RGB values, in strip order, to the strip
+            Brightness and byte order are applied in one step, and written
+            straight to the pixel buffer instead of pixel by pixel.
+            brightness overrides the strip brightness for this write only (fades, twinkles)
+        """
+        if pixels is not self._strip_pixels:
+            # Keep a copy of what is on the strip
+            self._strip_pixels[:] = pixels
+
+        if brightness is None:
+            brightness = self.np.brightness
+
+        post = getattr(self.np, "_post_brightness_buffer", None)
+        if post is None:
+            # Not the pure python pixel buffer, fall back to setting each pixel
+            for i, px in enumerate(pixels.tolist()):
+                self.np[i] = tuple(px)
+        else:
+            bpp = self.np._bpp
+            offset = getattr(self.np, "_offset", 0)
+            order = list(self.np._byteorder[:3])
+            size = self.num_px * bpp
+
+            # Pre brightness buffer only exists once brightness != 1.0
+            pre = getattr(self.np, "_pre_brightness_buffer", None)
+            if pre is not None:
+                view = numpy.frombuffer(pre, dtype=numpy.uint8, count=size, offset=offset)
+                view.reshape(self.num_px, bpp)[:, order] = pixels
+
+            lut = self._get_brightness_lut(brightness)
+            view = numpy.frombuffer(post, dtype=numpy.uint8, count=size, offset=offset)
+            view.reshape(self.num_px, bpp)[:, order] = lut[pixels]
+
+        if show:
+            self.np.show()
+        return True
+
+    def show_frame(self, frame: numpy.ndarray = None, show: bool = True):
+        """ Push a (rows, cols, 3) frame to the panel, mapped through self.pixel_map
+            If no frame is provided, self.frame is used.
+        """
+        if frame is None:
+            frame = self.frame
+        self._strip_pixels[self._strip_index] = frame
+        return self.write_strip(self._strip_pixels, show=show)
+
+    def frame_stats(self) -> dict:
+        """ Frame timing statistics (rendered, dropped, late, etc) for the last animation
+        """
+        return self.scheduler.stats()
+
+    def rainbow_cycle(self, wait_ms=1, iterations=1, palette="rainbow"):
         """ Draw rainbow that uniformly distributes itself across all pixels.
             Source: Adafruit tutorials
+            palette can be any palette name or LUT, see photobooth.palette
         """
-        for j in range(255*iterations):
-            for i in range(self.np.n):
-                pixel_index = (i * 256 // self.np.n) + j
-                self.np[i] = wheel(self.np, pixel_index & 255)
-            self.np.show()
-            time.sleep(wait_ms/1000.0)
+        lut = get_palette(palette)
+        positions = numpy.arange(self.num_px) * 256 // self.num_px
+
+        # Shifting the palette is a roll, coloring the strip is one gather
+        for j in self.scheduler.frames(255*iterations, period=wait_ms/1000.0):
+            self.write_strip(numpy.roll(lut, -j, axis=0)[positions])
 
         return True
 
@@ -164,114 +385,85 @@ class Neopixel():
         """ Snake-like color chase from index 0 to -1
             Source: Adafruit tutorials
         """
-        for i in range(self.np.n):
-            self.np[i] = color
-            time.sleep(wait)
-            self.np.show()
+        pixels = numpy.zeros((self.num_px, 3), dtype=numpy.uint8)
+        for i in self.scheduler.frames(self.num_px, period=wait):
+            pixels[:i + 1] = color[:3]
+            self.write_strip(pixels)
         return True
 
-    def twinkle(self, wait: float = DEFAULT_SPEED, count: int = 10):
+    def twinkle(self, wait: float = DEFAULT_SPEED, count: int = 10, stop_event=None):
         """ Randomly selects a pixel, and flashes it with a random color
             Source: Adafruit tutorials
+            Stops early (after the current frame) once stop_event is set
         """
+        # Brightness for each frame of a single twinkle: ramp up, then ramp down
+        levels = [i / 5.0 for i in range(1, 5)] + [i / 5.0 for i in range(5, 0, -1)]
+
+        # Choose a random color and pixel per twinkle, never the same pixel twice in a row
+        twinkles = list()
         last = None
         for _ in range(count):
             c = randint(0, len(COLOR_TUPLE_LIST) - 1)  # Choose random color index
-            j = randint(0, self.np.n - 1)  # Choose random pixel
-
-            # Check that the pixel is off (different pixel)
-            while self.np[j] == last:
-                j = randint(0, self.np.n - 1)  # Choose a different random pixel
+            j = randint(0, self.num_px - 1)  # Choose random pixel
+            while j == last:
+                j = randint(0, self.num_px - 1)  # Choose a different random pixel
             last = j
-            self.np[j] = COLOR_TUPLE_LIST[c]  # Set pixel to color
-            self.np.show()
-            # Ramp up brightness
-            for i in range(1, 5):
-                self.np.brightness = i / 5.0
-                self.np.show()
-                time.sleep(wait)
-
-            # Ramp down brightness
-            for i in range(5, 0, -1):
-                self.np.brightness = i / 5.0
-                self.np[j] = OFF
-                self.np.show()
-                time.sleep(wait)
-
-    # TODO: Is reducing the current color of each pixel slowly to 0 a smoother execution?
+            twinkles.append((j, COLOR_TUPLE_LIST[c]))
+
+        pixels = self._strip_pixels.copy()
+        current = None
+        for n in self.scheduler.frames(count * len(levels), period=wait):
+            t, step = divmod(n, len(levels))
+            if t != current:
+                if current is not None:
+                    pixels[twinkles[current][0]] = OFF
+                current = t
+                j, color = twinkles[t]
+                pixels[j] = color  # Set pixel to color
+            self.write_strip(pixels, brightness=levels[step])
+            if stop_event is not None and stop_event.is_set():
+                break
+
+        if current is not None:
+            pixels[twinkles[current][0]] = OFF
+        return self.write_strip(pixels)
+
     def fade_out(self, duration: int = 1):
         """ Fades out to OFF over the duration
+            Brightness is only overridden while fading, the strip brightness is unchanged.
         """
         original_brightness = self.np.brightness
+        pixels = self._strip_pixels.copy()
 
-        step_level = 0.01
-        sleep_cycle = duration / (original_brightness / step_level)
-
-        while self.np.brightness > 0:
-            # FIXME :
-            # Im not totally sure why, but...
-            # self.np.brightness -= step_level
-            # causes self.np.brightness of 0.1 to become 0.09000000000000001
-            # and i dont feel like figuring out why right now
-            self.np.brightness = round(self.np.brightness - step_level, 2)
-            self.np.show()
-            time.sleep(sleep_cycle)
+        steps = max(1, round(duration / self.scheduler.period)) if self.scheduler.period else 1
+        for n in self.scheduler.frames(steps):
+            self.write_strip(pixels, brightness=original_brightness * (1 - (n + 1) / steps))
 
-        self.np.fill(OFF)
-        self.np.show()
-
-        # Reset brightness to original value now that pixels are OFF
-        self.np.brightness = original_brightness
-
-        return True
+        self.frame[:] = OFF
+        return self.show_frame()
 
     def draw_text(self, text: str, x_offset: int = 0,
-                  font_name: str = "Apple_II_mod.ttf", font_pt: int = 8) -> Image.Image:
+                  font_name: str = DEFAULT_FONT, font_pt: int = DEFAULT_FONT_PT) -> Image.Image:
         """ Using PIL, draw text into an image to be scrolled
+            Repeated messages are served from a cache, see render_text()
         """
-        if self.rows < 5:
-            raise ValueError(
-                f"Unable to scroll text on a board with rows < 5 px. Board Rows: {self.rows} ")
-
-        text = str(text)
-
-        if not font_name.endswith('.ttf'):
-            font_name = f'{font_name}.ttf'
-
-        if not os.path.exists(f"{RESOURCES}/{font_name}"):
-            raise ValueError(
-                f"The font: '{font_name}' could not be found, please try a font in ./resources")
-
-        font = ImageFont.truetype(f"{RESOURCES}/{font_name}", font_pt)
-        text_width, text_height = font.getsize(text)
-
-        # FIXME :
-        # For some reason we need to remove 1 px from the image width
-        # for it to clear smoothly at the end
-        # Instead of messing with the math, a workaround of clearing the panel
-        # after the scroll was added
-        image = Image.new('P', (text_width + (self.cols * 2), self.rows), 0)
-        draw = ImageDraw.Draw(image)
-
-        draw.text((self.cols, x_offset), text, font=font, fill=255)
-
-        return image
+        return render_text(str(text), self.rows, self.cols, x_offset=x_offset,
+                           font_name=font_name, font_pt=font_pt)
 
     def scroll(self, text,
                speed: float = DEFAULT_SPEED,
                count=1,
                offset_x: int = 0,
-               color: tuple((int, int, int)) = WHITE):
+               color: tuple((int, int, int)) = WHITE,
+               font_name: str = DEFAULT_FONT,
+               font_pt: int = DEFAULT_FONT_PT,
+               stop_event=None):
         """ Scroll the input across the board
+            text can be a str, or a PIL.Image.Image from draw_text()
+            Stops early (after the current column) once stop_event is set
         """
-
-        rows = self.rows
         cols = self.cols
 
-        # Check if text is not a PIL.Image.Image object
-        if not isinstance(text, Image.Image):
-            text = self.draw_text(text)
-
         if not isinstance(speed, float):
             raise ValueError(
                 f"Neopixel().scroll(speed) must be a float. Received: {speed} ({type(speed)})")
@@ -280,33 +472,90 @@ class Neopixel():
             raise ValueError(
                 f"Neopixel().scroll(speed) must be less than 1.0. Received: {speed}")
 
+        valid, color = valid_color_tuple(color, fix=True)
+
+        # The whole message is rendered once, each frame is a slice of it
+        if isinstance(text, Image.Image):
+            bitmap = text_bitmap(text, self.rows, cols, color=color)
+        else:
+            bitmap = cached_text_bitmap(str(text), self.rows, cols, color=color,
+                                        font_name=font_name, font_pt=font_pt)
+
         # FIXME: Better way to do this part
         # Reconstruct the original text width from
         # image = Image.new('P', (text_width + (self.cols * 2) - 1, self.rows), 0)
-        # in self.draw_text()
-        text_width = text.width - (self.cols * 2)
+        # in render_text()
+        bitmap_width = bitmap.shape[1]
+        text_width = bitmap_width - (cols * 2)
+        frame = self.frame
 
-        valid, color = valid_color_tuple(color, fix=True)
+        # Offsets wrap back to 0 once the end of the bitmap is on the panel
+        positions = bitmap_width - cols + 1
+        frames = count * (text_width + cols)
 
         # TODO: All this math should be revisited
-        for n in range(count):
-            i = text_width + cols
-            while i > 0:
-                for x in range(cols):
-                    for y in range(rows):
-                        if text.getpixel((x + offset_x, y)) == 255:
-                            self.np[getIndex(x, y, rows, cols)] = color
-                        else:
-                            self.np[getIndex(x, y, rows, cols)] = (0, 0, 0)
-                offset_x += 1
-                if offset_x + cols > text.size[0]:
-                    offset_x = 0
-                self.np.show()
-                time.sleep(speed)  # scrolling text speed
-                i -= 1
+        for n in self.scheduler.frames(frames, period=speed):  # scrolling text speed
+            x = (offset_x + n) % positions
+            frame[:] = bitmap[:, x:x + cols]
+            self.show_frame(frame)
+            if stop_event is not None and stop_event.is_set():
+                break
         self.clear()  # Sometimes the last few px are visible, this just clears it off.
         return True
 
+    def add_layer(self, layer):
+        """ Add a layer (see photobooth.compositor) to be drawn by play()
+        """
+        return self.compositor.add_layer(layer)
+
+    def remove_layer(self, name: str) -> bool:
+        return self.compositor.remove_layer(name)
+
+    def text_layer(self, text, speed: float = DEFAULT_SPEED, count: int = 1,
+                   color: tuple = WHITE, font_name: str = DEFAULT_FONT,
+                   font_pt: int = DEFAULT_FONT_PT, **kwargs) -> TextLayer:
+        """ Add a layer that scrolls text, count=None scrolls until the layer is removed
+            **kwargs are passed to the layer (name, z, opacity)
+        """
+        valid, color = valid_color_tuple(color, fix=True)
+        if isinstance(text, Image.Image):
+            bitmap = text_bitmap(text, self.rows, self.cols, color=color)
+        else:
+            bitmap = cached_text_bitmap(str(text), self.rows, self.cols, color=color,
+                                        font_name=font_name, font_pt=font_pt)
+        layer = TextLayer(bitmap, self.cols, speed=speed, count=count, **kwargs)
+        return self.add_layer(layer)
+
+    def twinkle_layer(self, wait: float = DEFAULT_SPEED, count: int = None,
+                      **kwargs) -> TwinkleLayer:
+        """ Add a layer of random twinkling pixels, count=None twinkles until removed
+            **kwargs are passed to the layer (name, z, opacity)
+        """
+        layer = TwinkleLayer(COLOR_TUPLE_LIST, wait=wait, count=count, **kwargs)
+        return self.add_layer(layer)
+
+    def palette_layer(self, palette="rainbow", speed: float = DEFAULT_SPEED,
+                      **kwargs) -> PaletteLayer:
+        """ Add a background layer that cycles a palette across the panel
+            **kwargs are passed to the layer (name, z, opacity, duration)
+        """
+        layer = PaletteLayer(get_palette(palette), speed=speed, **kwargs)
+        return self.add_layer(layer)
+
+    def play(self, count: int = None, period: float = None, stop_event=None):
+        """ Draw the compositor layers to the panel, one blended frame per tick
+            Runs for count frames, or until every layer with a duration is done.
+            If there are only endless layers, runs until count or stop_event.set()
+        """
+        wait_for_layers = self.compositor.pending()
+        for n in self.scheduler.frames(count, period=period):
+            self.show_frame(self.compositor.compose())
+            if stop_event is not None and stop_event.is_set():
+                break
+            if wait_for_layers and not self.compositor.pending():
+                break
+        return True
+
     # TODO :
     def flash(self, **kwargs):
         """ Flash the input on the board n times
@@ -324,9 +573,8 @@ class Neopixel():
     def clear(self):
         """ clear the panel and set all pixels to OFF
         """
-        self.np.fill(OFF)
-        self.np.show()
-        return True
+        self.frame[:] = OFF
+        return self.show_frame()
 
     def fill(self, color=WHITE):
         """ Fill the panel to a specific color
@@ -353,9 +601,8 @@ class Neopixel():
                                  "please use a number in the range 0-255")
             else:
                 color = (color, color, color)
-        self.np.fill(color)
-        self.np.show()
-        return True
+        self.frame[:] = color[:3]
+        return self.show_frame()
 
     def panel_test(self, extended=False):
         """ Runs a panel test by cycling some various logic
@@ -0,0 +1,141 @@
+"""
+Color palettes for LED effects
+
+A palette is a 256 entry RGB lookup table (LUT), a (256, 3) uint8 array.
+Effects index into it with an array of positions, so coloring a whole frame
+is a single gather: lut[positions]
+
+Built in palettes are 'rainbow' and 'heat'. Gradients can be added with
+register_palette(), or loaded from a JSON file (see resources/palettes.json):
+    {
+        "sunset": ["#200040", "#ff0040", "#ffa000"],
+        "ocean": [[0.0, [0, 0, 32]], [0.8, [0, 128, 255]], [1.0, "#ffffff"]]
+    }
+A list of colors is spread evenly, or [position, color] pairs place each stop (0.0-1.0).
+"""
+import json
+import os
+import numpy
+
+ABSPATH = os.path.dirname(__file__)
+RESOURCES = os.path.join(ABSPATH, 'resources')
+
+DEFAULT_PALETTE_PATH = os.path.join(RESOURCES, 'palettes.json')
+
+LUT_SIZE = 256
+
+
+def rainbow_lut() -> numpy.ndarray:
+    """ The color wheel as a LUT, r - g - b - back to r
+        Same values as neopixel.wheel() (Source: Adafruit tutorials)
+    """
+    pos = numpy.arange(LUT_SIZE)
+    lut = numpy.zeros((LUT_SIZE, 3), dtype=numpy.uint8)
+
+    first = pos < 85
+    lut[first, 0] = pos[first] * 3
+    lut[first, 1] = 255 - pos[first] * 3
+
+    second = (pos >= 85) & (pos < 170)
+    lut[second, 0] = 255 - (pos[second] - 85) * 3
+    lut[second, 2] = (pos[second] - 85) * 3
+
+    third = pos >= 170
+    lut[third, 1] = (pos[third] - 170) * 3
+    lut[third, 2] = 255 - (pos[third] - 170) * 3
+    return lut
+
+
+def parse_color(color) -> tuple:
+    """ Accepts '#rrggbb', 'rrggbb' or an (r, g, b) sequence
+    """
+    if isinstance(color, str):
+        value = color.lstrip('#')
+        if len(value) != 6:
+            raise ValueError(f"Colors must be '#rrggbb'. Received: {color}")
+        return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+    color = tuple(color)
+    if len(color) < 3 or not all(isinstance(c, int) and 0 <= c <= 255 for c in color[:3]):
+        raise ValueError(f"Colors must be 3 ints in the range 0-255. Received: {color}")
+    return color[:3]
+
+
+def gradient_lut(stops: list) -> numpy.ndarray:
+    """ Build a LUT that blends between colors
+        stops is a list of colors (evenly spaced), or a list of (position, color)
+        pairs where position is 0.0-1.0
+    """
+    if len(stops) < 2:
+        raise ValueError("A gradient needs at least 2 colors")
+
+    if all(isinstance(s, (list, tuple)) and len(s) == 2 and isinstance(s[0], (int, float))
+           for s in stops):
+        positions = [float(p) for p, c in stops]
+        colors = [parse_color(c) for p, c in stops]
+    else:
+        positions = list(numpy.linspace(0.0, 1.0, len(stops)))
+        colors = [parse_color(c) for c in stops]
+
+    if positions != sorted(positions):
+        raise ValueError(f"Gradient positions must be in order. Received: {positions}")
+
+    x = numpy.linspace(0.0, 1.0, LUT_SIZE)
+    colors = numpy.array(colors, dtype=numpy.float32)
+    lut = numpy.stack([numpy.interp(x, positions, colors[:, c]) for c in range(3)], axis=1)
+    return numpy.round(lut).astype(numpy.uint8)
+
+
+def heat_lut() -> numpy.ndarray:
+    """ Black - red - yellow - white
+    """
+    return gradient_lut([(0.0, (0, 0, 0)), (0.4, (255, 0, 0)),
+                         (0.8, (255, 255, 0)), (1.0, (255, 255, 255))])
+
+
+PALETTES = dict()
+
+
+def register_palette(name: str, palette) -> numpy.ndarray:
+    """ Add a palette by name, from a (256, 3) LUT or a list of gradient stops
+    """
+    if isinstance(palette, numpy.ndarray):
+        if palette.shape != (LUT_SIZE, 3):
+            raise ValueError(f"A palette LUT must be shaped ({LUT_SIZE}, 3). "
+                             f"Received: {palette.shape}")
+        lut = palette.astype(numpy.uint8)
+    else:
+        lut = gradient_lut(palette)
+
+    lut.flags.writeable = False
+    PALETTES[name] = lut
+    return lut
+
+
+def load_palettes(path: str = DEFAULT_PALETTE_PATH) -> list:
+    """ Load gradients from a JSON file of {name: stops}, returns the names loaded
+    """
+    with open(os.path.expanduser(path), 'r') as fh:
+        config = json.load(fh)
+
+    for name, stops in config.items():
+        register_palette(name, stops)
+    return list(config)
+
+
+def get_palette(palette="rainbow") -> numpy.ndarray:
+    """ Look up a palette by name, LUTs are passed through as is
+    """
+    if isinstance(palette, numpy.ndarray):
+        return palette
+    if palette not in PALETTES:
+        raise ValueError(f"The palette: {palette} is not supported. "
+                         f"Please use one of {list(PALETTES)}")
+    return PALETTES[palette]
+
+
+register_palette("rainbow", rainbow_lut())
+register_palette("heat", heat_lut())
+
+if os.path.exists(DEFAULT_PALETTE_PATH):
+    load_palettes(DEFAULT_PALETTE_PATH)
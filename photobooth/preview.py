@@ -0,0 +1,165 @@
+"""
+Fast previews of captures for the last shot screen
+
+A full resolution capture takes a while to land, copy and decode in the browser.
+Most cameras embed a small JPEG thumbnail in the EXIF header, which can be pulled
+out of the first few KB of the file without decoding anything. That is published
+to the screen straight away, and swapped for a screen sized copy once it's made.
+
+    publish_bytes(exif_thumbnail(pic), last_jpg)  # Something on screen right away
+    screen_image(pic, last_jpg)  # Then the sharp version
+
+Writes are atomic (a unique temp file, then a rename). Pass each write the
+generation from new_generation(target) to drop writes that finish after a newer
+shot has started publishing, e.g. a slow downscale of the previous shot.
+"""
+import os
+import shutil
+import struct
+import tempfile
+import threading
+
+from PIL import Image
+
+DEFAULT_SCREEN_SIZE = (1920, 1080)
+DEFAULT_SCREEN_QUALITY = 85
+
+# Only this much of the file is read looking for the EXIF header
+EXIF_READ_SIZE = 128 * 1024
+
+JPEG_SOI = b"\xff\xd8"
+EXIF_APP1 = 0xE1
+EXIF_HEADER = b"Exif\x00\x00"
+
+# IFD1 tags that locate the thumbnail, offsets are from the start of the TIFF header
+TAG_THUMB_OFFSET = 0x0201
+TAG_THUMB_LENGTH = 0x0202
+
+_generations = dict()  # target: latest generation
+_generations_lock = threading.Lock()
+
+
+def _exif_segment(data: bytes) -> bytes:
+    """ Find the EXIF APP1 segment in the start of a JPEG, returns the TIFF data or None
+    """
+    if not data.startswith(JPEG_SOI):
+        return None
+
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker in (0xD9, 0xDA):
+            # End of image / start of scan, the headers are over
+            return None
+        length = struct.unpack_from(">H", data, offset + 2)[0]
+        segment = data[offset + 4:offset + 2 + length]
+        if marker == EXIF_APP1 and segment.startswith(EXIF_HEADER):
+            return segment[len(EXIF_HEADER):]
+        offset += 2 + length
+    return None
+
+
+def exif_thumbnail(path: str) -> bytes:
+    """ The JPEG thumbnail embedded in a capture's EXIF header, or None if it doesn't have one
+        Only the header is read, the image itself is never decoded.
+    """
+    with open(path, 'rb') as fh:
+        tiff = _exif_segment(fh.read(EXIF_READ_SIZE))
+    if not tiff or len(tiff) < 8:
+        return None
+
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if not endian:
+        return None
+
+    def ifd_entries(ifd):
+        count = struct.unpack_from(f"{endian}H", tiff, ifd)[0]
+        entries = dict()
+        for i in range(count):
+            tag, kind, n, value = struct.unpack_from(f"{endian}HHII", tiff, ifd + 2 + (i * 12))
+            if kind == 3:
+                # SHORT values are left aligned in the 4 byte value field
+                value = struct.unpack_from(f"{endian}H", tiff, ifd + 10 + (i * 12))[0]
+            entries[tag] = value
+        next_ifd = struct.unpack_from(f"{endian}I", tiff, ifd + 2 + (count * 12))[0]
+        return entries, next_ifd
+
+    try:
+        ifd0 = struct.unpack_from(f"{endian}I", tiff, 4)[0]
+        _, ifd1 = ifd_entries(ifd0)
+        if not ifd1:
+            return None
+        entries, _ = ifd_entries(ifd1)
+    except struct.error:
+        return None  # Truncated or corrupt header
+
+    start, length = entries.get(TAG_THUMB_OFFSET), entries.get(TAG_THUMB_LENGTH)
+    if not start or not length or start + length > len(tiff):
+        return None
+    thumbnail = tiff[start:start + length]
+    return thumbnail if thumbnail.startswith(JPEG_SOI) else None
+
+
+def new_generation(target: str) -> int:
+    """ Start a new generation of writes to target, older generations' writes are dropped
+    """
+    with _generations_lock:
+        _generations[target] = _generations.get(target, 0) + 1
+        return _generations[target]
+
+
+def _temp_for(target: str) -> str:
+    """ A new temp file next to target, unique so concurrent writers never share one
+    """
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(target)}.", suffix=".tmp",
+                               dir=os.path.dirname(target) or ".")
+    os.close(fd)
+    return tmp
+
+
+def _replace(tmp: str, target: str, generation: int = None) -> bool:
+    """ Move tmp over target, unless a newer generation has started
+    """
+    with _generations_lock:
+        if generation is None or generation == _generations.get(target):
+            os.replace(tmp, target)
+            return True
+    os.remove(tmp)
+    return False
+
+
+def publish_bytes(data: bytes, target: str, generation: int = None) -> bool:
+    """ Write data to target atomically, so the browser never loads a partial file
+        Returns False if the write was dropped for a newer generation
+    """
+    tmp = _temp_for(target)
+    with open(tmp, 'wb') as fh:
+        fh.write(data)
+    return _replace(tmp, target, generation)
+
+
+def publish_file(path: str, target: str, generation: int = None) -> bool:
+    """ Copy path to target atomically (see publish_bytes)
+    """
+    tmp = _temp_for(target)
+    shutil.copyfile(path, tmp)
+    return _replace(tmp, target, generation)
+
+
+def screen_image(path: str, target: str, size: tuple = DEFAULT_SCREEN_SIZE,
+                 quality: int = DEFAULT_SCREEN_QUALITY, generation: int = None) -> str:
+    """ Write a copy of path that fits within size to target, returns target
+        (None if it was dropped for a newer generation)
+        draft() lets the JPEG decoder skip straight to a reduced scale (1/2, 1/4, 1/8),
+        so an 18MP capture is never decoded at full size.
+    """
+    with Image.open(path) as image:
+        image.draft('RGB', size)
+        image = image.convert('RGB')
+        image.thumbnail(size, Image.BILINEAR)
+
+        tmp = _temp_for(target)
+        image.save(tmp, 'JPEG', quality=quality)
+    return target if _replace(tmp, target, generation) else None
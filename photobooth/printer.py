@@ -1,59 +1,22 @@
 from escpos.printer import Usb
 from inspect import getfullargspec
 
-# Lookup USB Devices - https://www.the-sz.com/products/usbid/
-# TODO: Maybe convert this to a collection of YAML files that are ingested?
-PRINTER_MAP = {
-    "default": {
-        "model": "Unknown",
-        "config": {
-            "idVendor": 0x0416,
-            "idProduct": 0x5011,
-            "in_ep": 0x81,
-            "out_ep": 0x01,
-            "timeout": 0
-        },
-        "details": {
-            "paperSizes": [],
-            "connection_type": None,
-            "autoCut": None,
-            "print_modes": {
-                "thermal": None,
-                "inkjet": None,
-                "photo": None,
-                "laser": None
-            }
-        }
-    },
-    "PBM-8350U": {
-        "model": "PBM-8350U",
-        "config": {
-            "idVendor": 0x0416,
-            "idProduct": 0x5011,
-            "in_ep": 0x81,
-            "out_ep": 0x03,
-            "timeout": 0
-        },
-        "details": {
-            "paperSizes": [
-                "80mm"
-            ],
-            "connection_type": "usb",
-            "autoCut": True,
-            "print_modes": {
-                "thermal": True,
-                "inkjet": False,
-                "photo": False,
-                "laser": False
-            }
-        }
-    }
-}
+from photobooth.printer_registry import get_printer_registry, printer_capabilities
+from photobooth.raster import DEFAULT_DITHER, cached_raster, encode_image
+from photobooth.receipt import CUT_FEED, get_template
+
+# DLE EOT 4, real time paper sensor status. Bits 5 and 6 of the reply are set at paper end
+PAPER_STATUS = b"\x10\x04\x04"
+PAPER_END = 0x60
+
+# Milliseconds to wait for a status reply
+STATUS_TIMEOUT = 500
 
 
 class Printer():
-    """ Loads a printer according to the model supplied (explicit list of support)
+    """ Loads a printer according to the model supplied (see photobooth.printer_registry)
         and provides common functions
+        Without a model, the first attached printer with a known USB id is used.
     """
     def __init__(self,
                  name: str = "",
@@ -65,28 +28,35 @@ class Printer():
             name = f"printer-{id(self)}"
         self.name = name
 
-        if model:
-            self.printer_spec = PRINTER_MAP.get(str(model), dict())
-        else:
-            self.printer_spec = PRINTER_MAP.get("default")
+        registry = get_printer_registry()
+        if not model:
+            detected = [printer for printer in registry.detect() if printer["model"]]
+            if detected:
+                model = detected[0]["model"]
+        self.printer_spec = registry.get(model)
 
         self.model = self.printer_spec.get('model', 'unknown')
 
-        valid_kwargs = getfullargspec(Usb)
+        valid_kwargs = getfullargspec(Usb).args
         # ['self', 'idVendor', 'idProduct', 'timeout', 'in_ep', 'out_ep']
 
         # Look for kwargs passed that match a kwarg for Usb() and override
-        for k, v in kwargs:
+        for k in list(kwargs):
             if k in valid_kwargs:
-                self.printer_spec["config"][k] = kwargs.pop(k, None)
+                self.printer_spec["config"][k] = kwargs.pop(k)
 
         self.inputs = locals()
+        self.capabilities = printer_capabilities(self.printer_spec)
 
         config = self.printer_spec['config']
+        if registry.is_attached(config["idVendor"], config["idProduct"]) is False:
+            attached = [f"{p['idVendor']:04x}:{p['idProduct']:04x} ({p['model'] or p['product']})"
+                        for p in registry.detect()]
+            raise ValueError(f"The printer: {self.model} "
+                             f"({config['idVendor']:04x}:{config['idProduct']:04x}) "
+                             f"is not attached. Attached printers: {attached}")
         self.printer = Usb(**config)
 
-        # TODO: Add logic that verifies the printer is working
-
     def ln(self, count=1):
         """ feeds n lines to print buffer
             replicates Escpos().ln() in newer version (>=3.0)
@@ -108,7 +78,10 @@ class Printer():
     def cut(self, mode="PART"):
         """ Pass through to Escpos().cut()
             https://github.com/python-escpos/python-escpos/blob/cbe38648f50dd42e25563bd8603953eaa13cb7f6/src/escpos/escpos.py#L597
+            Printers without an autocutter just feed the paper past the tear bar.
         """
+        if self.capabilities["autocut"] is False:
+            return self.ln(CUT_FEED)
         return self.printer.cut(mode)
 
     # TODO: Make this better
@@ -125,6 +98,52 @@ class Printer():
         """
         return self.printer.qr(*args, **kwargs)
 
+    def image(self, path: str, width: int = None, dither: str = DEFAULT_DITHER,
+              cache: bool = True):
+        """ Print a photo as ESC/POS raster graphics
+            The image is scaled to the head width (capabilities paper_width, in dots), dithered
+              (floyd-steinberg, bayer or threshold) and encoded once. The encoded bytes are
+              cached by the image's content, so a reprint is a single write to the printer.
+        """
+        if self.capabilities["raster"] is False:
+            raise ValueError(f"The printer: {self.model} does not support raster images")
+        if not width:
+            width = self.capabilities["paper_width"]
+        if cache:
+            data = cached_raster(path, width=width, mode=dither)
+        else:
+            data = encode_image(path, width=width, mode=dither)
+        self.printer._raw(data)
+        return True
+
+    def check(self) -> bool:
+        """ True if the printer answers a status request and has paper
+            Reopens the USB device first if it was unplugged (or the handle went stale),
+            used by PrinterPool to decide when a failed printer can go back into rotation.
+        """
+        usb = self.printer
+        try:
+            if getattr(usb, "device", None) is None:
+                usb.open()
+            usb.device.write(usb.out_ep, PAPER_STATUS, STATUS_TIMEOUT)
+            reply = usb.device.read(usb.in_ep, 1, STATUS_TIMEOUT)
+        except Exception:
+            try:
+                usb.close()
+            except Exception:
+                pass
+            return False
+        return bool(reply) and not reply[0] & PAPER_END
+
+    def receipt(self, template, **fields):
+        """ Print a receipt template (a ReceiptTemplate, or the name of a registered one)
+            The template renders to one buffer for this printer's capabilities (print width,
+              raster, native QR codes), which is sent in a single write.
+            See photobooth.receipt
+        """
+        self.printer._raw(get_template(template).render(capabilities=self.capabilities, **fields))
+        return True
+
     # TODO :
     # Possible answer to a dynamic pass through method
     # Disabling because i dont feel like testing it right now
@@ -0,0 +1,226 @@
+"""
+Printer profiles, loaded from data files and matched to attached USB devices
+
+Each file in resources/printers describes one model: the Usb() config (USB ids and
+endpoints) and details (paper, print width in dots, autocut, raster support, whether it
+draws QR codes itself):
+    {
+        "model": "PBM-8350U",
+        "config": {"idVendor": "0x0416", "idProduct": "0x5011", "in_ep": "0x81",
+                   "out_ep": "0x03", "timeout": 0},
+        "details": {"paperSizes": ["80mm"], "printWidth": 576, "autoCut": true,
+                    "raster": true, "nativeQR": false, ...}
+    }
+Ids can be ints or hex strings. default.json is the fallback for unknown printers,
+it isn't matched by USB id.
+
+Attached printers are found by reading the USB descriptors the kernel already
+exposes in sysfs, nothing is opened or sent to the devices:
+    registry = get_printer_registry()
+    registry.detect()  # [{"model": "PBM-8350U", "idVendor": 1046, "idProduct": 20497, ...}]
+"""
+import copy
+import json
+import os
+
+from photobooth.raster import DEFAULT_PRINT_WIDTH
+
+ABSPATH = os.path.dirname(__file__)
+RESOURCES = os.path.join(ABSPATH, 'resources')
+
+DEFAULT_PROFILE_DIR = os.path.join(RESOURCES, 'printers')
+DEFAULT_PROFILE = "default"
+
+SYSFS_USB_DEVICES = "/sys/bus/usb/devices"
+
+# bInterfaceClass of USB printers
+USB_CLASS_PRINTER = 0x07
+
+# Config values that are USB ids or endpoints, hex strings in the files
+HEX_KEYS = ["idVendor", "idProduct", "in_ep", "out_ep"]
+
+
+def parse_int(value) -> int:
+    """ An int from an int or a '0x..' / decimal string
+    """
+    if isinstance(value, str):
+        return int(value, 0)
+    return int(value)
+
+
+def check_profile(spec: dict, source: str = "") -> dict:
+    """ Check a printer profile has what Printer() needs, and turn hex ids into ints
+    """
+    source = source or spec.get("model", "")
+    for key in ("model", "config"):
+        if key not in spec:
+            raise ValueError(f"The printer profile: {source} is missing '{key}'")
+    for key in ("idVendor", "idProduct"):
+        if key not in spec["config"]:
+            raise ValueError(f"The printer profile: {source} is missing config.{key}")
+    for key in HEX_KEYS:
+        if key in spec["config"]:
+            spec["config"][key] = parse_int(spec["config"][key])
+    spec.setdefault("details", dict())
+    return spec
+
+
+def load_profile(path: str) -> dict:
+    """ Load and check one printer profile file
+    """
+    with open(path, 'r') as fh:
+        return check_profile(json.load(fh), source=path)
+
+
+def printer_capabilities(spec: dict) -> dict:
+    """ What the print pipeline needs to know about a printer
+        None means the profile doesn't say, callers should assume it works.
+    """
+    details = spec.get("details", dict())
+    return {
+        "paper_sizes": list(details.get("paperSizes") or []),
+        "paper_width": details.get("printWidth") or DEFAULT_PRINT_WIDTH,
+        "autocut": details.get("autoCut"),
+        "raster": details.get("raster"),
+        "native_qr": bool(details.get("nativeQR")),
+        "connection_type": details.get("connection_type")
+    }
+
+
+def read_sysfs(path: str) -> str:
+    try:
+        with open(path, 'r') as fh:
+            return fh.read().strip()
+    except OSError:
+        return None
+
+
+def scan_usb(sysfs: str = SYSFS_USB_DEVICES) -> list:
+    """ Every USB device in sysfs, as dicts of its descriptors
+        interface_classes is the bInterfaceClass of each of its interfaces.
+    """
+    if not os.path.isdir(sysfs):
+        return list()
+
+    devices = dict()
+    interfaces = dict()
+    for entry in sorted(os.listdir(sysfs)):
+        path = os.path.join(sysfs, entry)
+        if ":" in entry:
+            # Interface, "<device>:<config>.<interface>"
+            value = read_sysfs(os.path.join(path, "bInterfaceClass"))
+            if value:
+                interfaces.setdefault(entry.split(":")[0], list()).append(int(value, 16))
+            continue
+        vendor = read_sysfs(os.path.join(path, "idVendor"))
+        product = read_sysfs(os.path.join(path, "idProduct"))
+        if not vendor or not product:
+            continue
+        devices[entry] = {
+            "device": entry,
+            "idVendor": int(vendor, 16),
+            "idProduct": int(product, 16),
+            "manufacturer": read_sysfs(os.path.join(path, "manufacturer")),
+            "product": read_sysfs(os.path.join(path, "product")),
+            "serial": read_sysfs(os.path.join(path, "serial")),
+            "busnum": read_sysfs(os.path.join(path, "busnum")),
+            "devnum": read_sysfs(os.path.join(path, "devnum"))
+        }
+
+    for name, device in devices.items():
+        device["interface_classes"] = interfaces.get(name, list())
+    return list(devices.values())
+
+
+class PrinterRegistry():
+    """ Printer profiles by model, indexed by (idVendor, idProduct)
+    """
+    def __init__(self, profile_dir: str = DEFAULT_PROFILE_DIR, sysfs: str = SYSFS_USB_DEVICES):
+        self.profile_dir = profile_dir
+        self.sysfs = sysfs
+        self.profiles = dict()  # model: spec
+        self.usb_index = dict()  # (idVendor, idProduct): model
+        self._devices = None
+
+        if profile_dir and os.path.isdir(profile_dir):
+            for filename in sorted(os.listdir(profile_dir)):
+                if filename.endswith(".json"):
+                    name = os.path.splitext(filename)[0]
+                    self.register(load_profile(os.path.join(profile_dir, filename)), name=name)
+
+    def register(self, spec: dict, name: str = None) -> dict:
+        """ Add a profile (a dict like the profile files), indexing it by its USB ids
+            Profiles added later win for the same ids.
+        """
+        if name == DEFAULT_PROFILE:
+            self.profiles[DEFAULT_PROFILE] = spec
+            return spec
+        self.profiles[spec["model"]] = spec
+        config = spec["config"]
+        self.usb_index[(config["idVendor"], config["idProduct"])] = spec["model"]
+        return spec
+
+    def models(self) -> list:
+        return [model for model in self.profiles if model != DEFAULT_PROFILE]
+
+    def get(self, model: str = None) -> dict:
+        """ A copy of a model's profile (the default profile if model is empty)
+        """
+        model = str(model) if model else DEFAULT_PROFILE
+        if model not in self.profiles:
+            raise ValueError(f"The printer model: {model} is not supported. "
+                             f"Please use one of {self.models()}")
+        return copy.deepcopy(self.profiles[model])
+
+    def match(self, id_vendor: int, id_product: int) -> str:
+        """ The model registered for a USB id, or None
+        """
+        return self.usb_index.get((id_vendor, id_product))
+
+    def devices(self, refresh: bool = False) -> list:
+        """ Attached USB devices, read from sysfs once, refresh to scan again after a hotplug
+        """
+        if self._devices is None or refresh:
+            self._devices = scan_usb(self.sysfs)
+        return self._devices
+
+    def detect(self, refresh: bool = False) -> list:
+        """ Attached printers: USB devices with a known id (model set), or a printer class
+            interface (model None)
+        """
+        printers = list()
+        for device in self.devices(refresh=refresh):
+            model = self.match(device["idVendor"], device["idProduct"])
+            if model or USB_CLASS_PRINTER in device["interface_classes"]:
+                printers.append(dict(device, model=model))
+        return printers
+
+    def is_attached(self, id_vendor: int, id_product: int) -> bool:
+        """ Whether a USB id is attached, None if sysfs isn't available to tell
+        """
+        if not os.path.isdir(self.sysfs):
+            return None
+        # If it wasn't in the last scan, it may have been plugged in since
+        for refresh in (False, True):
+            if any(device["idVendor"] == id_vendor and device["idProduct"] == id_product
+                   for device in self.devices(refresh=refresh)):
+                return True
+        return False
+
+
+_registry = None
+
+
+def get_printer_registry() -> PrinterRegistry:
+    """ The registry of the bundled profiles, loaded the first time it is asked for
+    """
+    global _registry
+    if _registry is None:
+        _registry = PrinterRegistry()
+    return _registry
+
+
+def register_printer(spec: dict) -> dict:
+    """ Add a printer profile (a dict like the profile files) to the bundled registry
+    """
+    return get_printer_registry().register(check_profile(spec))
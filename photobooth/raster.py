@@ -0,0 +1,131 @@
+"""
+Photos to ESC/POS raster bytes for receipt printers
+
+A capture is scaled to the printer head width, dithered to black and white and
+packed into `GS v 0` raster commands (1 bit per dot, 8 dots per byte). The result
+is cached on disk by the capture's content hash, so a reprint is a single write
+of bytes that are already encoded.
+
+    data = encode_image("/opt/captures/shot.jpg", width=576)
+    printer._raw(data)
+"""
+import os
+import numpy
+
+from PIL import Image, ImageOps
+
+from photobooth.derivatives import file_digest
+
+DEFAULT_RASTER_DIR = "~/.cache/photobooth/raster"
+
+# Dots across the head, 576 for 80mm paper and 384 for 58mm at 203dpi
+DEFAULT_PRINT_WIDTH = 576
+
+DITHER_MODES = ["floyd-steinberg", "bayer", "threshold"]
+DEFAULT_DITHER = "floyd-steinberg"
+
+# Rows per GS v 0 command, printers have a limited receive buffer
+RASTER_BAND_HEIGHT = 256
+
+# GS v 0 m xL xH yL yH, m=0 is normal density
+GS_V0 = b"\x1dv0\x00"
+
+# Bump when the encoding changes, so old cache files aren't used
+RASTER_VERSION = 1
+
+
+def bayer_matrix(size: int = 8) -> numpy.ndarray:
+    """ Ordered dithering thresholds, a (size, size) array of 0.0-1.0
+    """
+    matrix = numpy.zeros((1, 1), dtype=numpy.int32)
+    while matrix.shape[0] < size:
+        matrix = numpy.block([[4 * matrix, 4 * matrix + 2],
+                              [4 * matrix + 3, 4 * matrix + 1]])
+    return (matrix + 0.5) / matrix.size
+
+
+BAYER_8 = bayer_matrix(8)
+
+
+def prepare(path: str, width: int = DEFAULT_PRINT_WIDTH) -> Image.Image:
+    """ Load an image as grayscale, scaled to width dots across
+        draft() decodes a JPEG at the smallest reduced scale (1/2 to 1/8) still width across
+    """
+    with Image.open(path) as image:
+        image.draft('L', (width, max(1, round(width * image.height / image.width))))
+        image = image.convert('L')
+    height = max(1, round(image.height * width / image.width))
+    image = image.resize((width, height), Image.BILINEAR)
+    # Thermal paper has little range, stretch the histogram to use all of it
+    return ImageOps.autocontrast(image, cutoff=1)
+
+
+def dither(image: Image.Image, mode: str = DEFAULT_DITHER) -> numpy.ndarray:
+    """ Black and white version of a grayscale image, a bool array where True is a black dot
+    """
+    if mode == "floyd-steinberg":
+        # Error diffusion is a serial scan, PIL does it in C
+        return numpy.asarray(image.convert('1', dither=Image.FLOYDSTEINBERG)) == 0
+    gray = numpy.asarray(image, dtype=numpy.float32) / 255.0
+    if mode == "bayer":
+        rows, cols = gray.shape
+        reps = (rows // BAYER_8.shape[0] + 1, cols // BAYER_8.shape[1] + 1)
+        return gray < numpy.tile(BAYER_8, reps)[:rows, :cols]
+    if mode == "threshold":
+        return gray < 0.5
+    raise ValueError(f"The dither mode: {mode} is not supported. Please use one of {DITHER_MODES}")
+
+
+def pack_raster(dots: numpy.ndarray, band_height: int = RASTER_BAND_HEIGHT) -> bytes:
+    """ Encode a bool array of dots as GS v 0 raster commands, one per band of rows
+    """
+    rows, cols = dots.shape
+    width_bytes = (cols + 7) // 8
+    # packbits pads each row out to a whole byte with white (0) dots
+    packed = numpy.packbits(dots, axis=1)
+
+    out = bytearray()
+    for top in range(0, rows, band_height):
+        band = packed[top:top + band_height]
+        height = band.shape[0]
+        out += GS_V0 + bytes([width_bytes & 0xFF, width_bytes >> 8, height & 0xFF, height >> 8])
+        out += band.tobytes()
+    return bytes(out)
+
+
+def encode_image(path: str, width: int = DEFAULT_PRINT_WIDTH, mode: str = DEFAULT_DITHER) -> bytes:
+    """ Everything needed to print an image: scale, dither and encode to ESC/POS bytes
+    """
+    return pack_raster(dither(prepare(path, width), mode))
+
+
+def raster_path(path: str, width: int, mode: str, cache_dir: str = DEFAULT_RASTER_DIR) -> str:
+    """ Cache file of an image's raster bytes, named by content hash so edits re-encode
+    """
+    digest = file_digest(path)
+    return os.path.join(os.path.expanduser(cache_dir), digest[:2],
+                        f"{digest}-{width}-{mode}-v{RASTER_VERSION}.escpos")
+
+
+def cached_raster(path: str, width: int = DEFAULT_PRINT_WIDTH, mode: str = DEFAULT_DITHER,
+                  cache_dir: str = DEFAULT_RASTER_DIR) -> bytes:
+    """ encode_image(), reading the bytes from the cache if this image was encoded before
+    """
+    if mode not in DITHER_MODES:
+        raise ValueError(f"The dither mode: {mode} is not supported. "
+                         f"Please use one of {DITHER_MODES}")
+    cache = raster_path(path, width, mode, cache_dir=cache_dir)
+    if os.path.exists(cache):
+        with open(cache, 'rb') as fh:
+            return fh.read()
+
+    data = encode_image(path, width=width, mode=mode)
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        tmp = f"{cache}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp, cache)
+    except OSError:
+        pass  # Not being able to cache to disk only costs an encode next print
+    return data
@@ -0,0 +1,248 @@
+"""
+Receipt templates, compiled to ESC/POS bytes
+
+A receipt is a list of blocks. Blocks without {fields} are encoded once when the
+template is made, blocks with fields are encoded per print (and cached per value),
+so a receipt goes to the printer as one buffer in a single write. QR codes and images
+depend on the printer, so they are always encoded per print, for the printer's
+capabilities (see photobooth.printer_registry).
+
+    THANKS = ReceiptTemplate([
+        ("align", "center"),
+        ("image", "{shot}"),
+        ("ln",),
+        ("qr", "{url}", {"size": 10}),
+        ("text", "Thank you for using our photobooth!\\n"),
+        ("cut",)
+    ])
+    printer.receipt(THANKS, shot=path, url="https://website.com")
+
+Templates can be registered by name (register_template), so a receipt can be
+queued on the print spooler as ("receipt", ["thanks"], {"shot": path, ...})
+
+Blocks:
+    ("text", text)
+    ("ln", count)
+    ("align", "left" | "center" | "right")
+    ("bold", True | False)
+    ("qr", content, {"size": 3, "ec": "M"})  - a raster image, or the printer's own QR code
+                                              if its profile has "nativeQR"
+    ("barcode", code, {"bc": "CODE128", "height": 64, "width": 3, "pos": "BELOW"})
+    ("image", path, {"width": 576, "dither": "floyd-steinberg"})  - see photobooth.raster,
+                                              width defaults to the printer's printWidth
+    ("cut", "PART" | "FULL")
+    ("raw", bytes)
+"""
+import re
+import string
+import numpy
+import qrcode
+
+from functools import lru_cache
+
+from photobooth.raster import DEFAULT_DITHER, DEFAULT_PRINT_WIDTH, cached_raster, pack_raster
+
+DEFAULT_ENCODING = "cp437"
+
+ESC = b"\x1b"
+GS = b"\x1d"
+
+ALIGN = {"left": 0, "center": 1, "right": 2}
+QR_EC = {"L": 48, "M": 49, "Q": 50, "H": 51}
+QR_IMAGE_EC = {"L": qrcode.constants.ERROR_CORRECT_L, "M": qrcode.constants.ERROR_CORRECT_M,
+               "Q": qrcode.constants.ERROR_CORRECT_Q, "H": qrcode.constants.ERROR_CORRECT_H}
+BARCODE_TYPES = {"UPC-A": 65, "UPC-E": 66, "EAN13": 67, "EAN8": 68, "CODE39": 69,
+                 "ITF": 70, "NW7": 71, "CODABAR": 71, "CODE93": 72, "CODE128": 73}
+BARCODE_POS = {"OFF": 0, "ABOVE": 1, "BELOW": 2, "BOTH": 3}
+CUT = {"FULL": 0, "PART": 1}
+
+# Lines fed before a cut, so the last line clears the cutter
+CUT_FEED = 4
+
+# Encoded dynamic blocks kept per template
+FIELD_CACHE_SIZE = 64
+
+# Blocks that are encoded for the printer they're printed on, at render()
+PRINTER_BLOCKS = ["qr", "image"]
+
+
+def encode_text(text: str, encoding: str = DEFAULT_ENCODING) -> bytes:
+    return text.encode(encoding, errors="replace")
+
+
+def check_qr(size: int, ec: str):
+    if not 1 <= size <= 16:
+        raise ValueError(f"QR size must be 1-16. Received: {size}")
+    if ec not in QR_EC:
+        raise ValueError(f"The QR error correction: {ec} is not supported. "
+                         f"Please use one of {list(QR_EC)}")
+
+
+def encode_qr(content: str, size: int = 3, ec: str = "M") -> bytes:
+    """ GS ( k commands for a model 2 QR code, drawn by the printer
+    """
+    check_qr(size, ec)
+    data = content.encode("utf-8")
+    store = len(data) + 3
+    return b"".join([
+        GS + b"(k\x04\x00\x31\x41\x32\x00",  # Model 2
+        GS + b"(k\x03\x00\x31\x43" + bytes([size]),  # Module size
+        GS + b"(k\x03\x00\x31\x45" + bytes([QR_EC[ec]]),  # Error correction
+        GS + b"(k" + bytes([store & 0xFF, store >> 8]) + b"\x31\x50\x30" + data,  # Store
+        GS + b"(k\x03\x00\x31\x51\x30"  # Print
+    ])
+
+
+def encode_qr_image(content: str, size: int = 3, ec: str = "M") -> bytes:
+    """ A model 2 QR code as a raster image, size dots per module, for any printer
+        Same layout as python-escpos' qr(native=False): a one module border.
+    """
+    check_qr(size, ec)
+    code = qrcode.QRCode(version=None, box_size=size, border=1,
+                         error_correction=QR_IMAGE_EC[ec])
+    code.add_data(content)
+    code.make(fit=True)
+    modules = numpy.array(code.get_matrix(), dtype=bool)
+    return pack_raster(numpy.kron(modules, numpy.ones((size, size), dtype=bool)))
+
+
+def encode_barcode(code: str, bc: str = "CODE128", height: int = 64, width: int = 3,
+                   pos: str = "BELOW") -> bytes:
+    """ GS k barcode, with its height, width and human readable text position
+    """
+    if bc not in BARCODE_TYPES:
+        raise ValueError(f"The barcode type: {bc} is not supported. "
+                         f"Please use one of {list(BARCODE_TYPES)}")
+    if bc == "CODE128" and not code.startswith("{"):
+        code = "{B" + code  # Code set B, printable ASCII
+    data = code.encode("ascii")
+    return b"".join([
+        GS + b"h" + bytes([height]),
+        GS + b"w" + bytes([width]),
+        GS + b"H" + bytes([BARCODE_POS[pos]]),
+        GS + b"k" + bytes([BARCODE_TYPES[bc], len(data)]) + data
+    ])
+
+
+def encode_block(kind: str, value=None, options: dict = None,
+                 encoding: str = DEFAULT_ENCODING, capabilities: dict = None) -> bytes:
+    """ ESC/POS bytes for one block, with any fields already filled in
+        capabilities are the printer's (Printer().capabilities), for QR codes and images.
+    """
+    options = options or dict()
+    capabilities = capabilities or dict()
+    if kind == "text":
+        return encode_text(value, encoding)
+    elif kind == "ln":
+        return b"\n" * (1 if value is None else int(value))
+    elif kind == "align":
+        return ESC + b"a" + bytes([ALIGN[value]])
+    elif kind == "bold":
+        return ESC + b"E" + bytes([1 if value else 0])
+    elif kind == "qr":
+        if capabilities.get("native_qr"):
+            return encode_qr(value, **options)
+        return encode_qr_image(value, **options)
+    elif kind == "barcode":
+        return encode_barcode(value, **options)
+    elif kind == "image":
+        if capabilities.get("raster") is False:
+            raise ValueError("This printer does not support raster images")
+        width = options.get("width") or capabilities.get("paper_width") or DEFAULT_PRINT_WIDTH
+        return cached_raster(value, width=width, mode=options.get("dither", DEFAULT_DITHER))
+    elif kind == "cut":
+        return b"\n" * CUT_FEED + GS + b"V" + bytes([CUT[value or "PART"]])
+    elif kind == "raw":
+        return bytes(value)
+    raise ValueError(f"The block type: {kind} is not supported")
+
+
+def template_fields(value) -> list:
+    """ Names of the {fields} in a block value
+    """
+    if not isinstance(value, str):
+        return list()
+    return [name for _, name, _, _ in string.Formatter().parse(value) if name]
+
+
+class ReceiptTemplate():
+    """ A receipt layout, compiled to ESC/POS bytes
+        Runs of static blocks are joined into one bytes object when the template is made.
+    """
+    def __init__(self, blocks: list, encoding: str = DEFAULT_ENCODING):
+        self.encoding = encoding
+        self.fields = list()
+        # A list of bytes (static runs) and (kind, value, options, has fields) for the rest
+        self.parts = list()
+
+        static = bytearray()
+        for block in blocks:
+            kind, value, options = (list(block) + [None, None])[:3]
+            names = template_fields(value)
+            if not names and kind not in PRINTER_BLOCKS:
+                static += encode_block(kind, value, options, encoding)
+                continue
+            if static:
+                self.parts.append(bytes(static))
+                static = bytearray()
+            self.parts.append((kind, value, options or dict(), bool(names)))
+            self.fields.extend(name for name in names if name not in self.fields)
+        if static:
+            self.parts.append(bytes(static))
+
+        # Same block and values, same bytes: QR codes aren't encoded twice. Images aren't
+        # kept here, a path can be overwritten, cached_raster() caches them by content.
+        self._encode = lru_cache(maxsize=FIELD_CACHE_SIZE)(self._encode_part)
+
+    def _encode_part(self, index: int, value: str, native_qr: bool) -> bytes:
+        kind, _, options, _ = self.parts[index]
+        return encode_block(kind, value, options, self.encoding, {"native_qr": native_qr})
+
+    def render(self, capabilities: dict = None, **fields) -> bytes:
+        """ The whole receipt as one bytes object, with fields filled in
+            capabilities are the printer's (Printer().capabilities), see encode_block()
+        """
+        missing = [name for name in self.fields if name not in fields]
+        if missing:
+            raise ValueError(f"Missing receipt fields: {missing}")
+
+        capabilities = capabilities or dict()
+        out = list()
+        for i, part in enumerate(self.parts):
+            if isinstance(part, bytes):
+                out.append(part)
+                continue
+            kind, value, options, has_fields = part
+            if has_fields:
+                value = value.format(**fields)
+            if kind == "image":
+                out.append(encode_block(kind, value, options, self.encoding, capabilities))
+            else:
+                out.append(self._encode(i, value, bool(capabilities.get("native_qr"))))
+        return b"".join(out)
+
+
+TEMPLATES = dict()
+
+
+def register_template(name: str, template) -> ReceiptTemplate:
+    """ Add a template by name, from a ReceiptTemplate or a list of blocks
+    """
+    if not isinstance(template, ReceiptTemplate):
+        template = ReceiptTemplate(template)
+    if not re.match(r"^[\w.-]+$", name):
+        raise ValueError(f"Template names can only use letters, numbers, '.', '-' and '_'. "
+                         f"Received: {name}")
+    TEMPLATES[name] = template
+    return template
+
+
+def get_template(template) -> ReceiptTemplate:
+    """ Look up a template by name, ReceiptTemplates are passed through as is
+    """
+    if isinstance(template, ReceiptTemplate):
+        return template
+    if template not in TEMPLATES:
+        raise ValueError(f"The receipt template: {template} is not registered. "
+                         f"Please use one of {list(TEMPLATES)}")
+    return TEMPLATES[template]
@@ -1,7 +1,8 @@
 from photobooth.booth import Booth
+from photobooth.gpio import DEFAULT_DEBOUNCE, DEFAULT_GPIO_BACKEND, ButtonEvents, \
+    get_gpio_backend
 
 
-import RPi.GPIO as GPIO
 import time
 
 #   (label, use, pin, io, init_state)
@@ -30,8 +31,14 @@ class RPi(Booth):
     compute_type = "SBC"
     family = "Raspberry Pi"
 
-    def __init__(self, **kwargs):
+    def __init__(self, gpio=None, debounce: float = DEFAULT_DEBOUNCE, **kwargs):
+        """ gpio is the GPIO backend, the RPi.GPIO module by default. Pass a SimulatedGPIO()
+              (or set PHOTOBOOTH_GPIO=simulated) to run without a Raspberry Pi.
+            debounce is the seconds a button has to settle before another change counts.
+        """
         self.kwargs = kwargs
+        self.debounce = debounce
+        self._gpio_backend = gpio or get_gpio_backend(DEFAULT_GPIO_BACKEND)
 
         # Init Booth
         Booth.__init__(self)
@@ -44,7 +51,7 @@ class RPi(Booth):
         """
         self.logger.info('Initializing GPIO')
 
-        self.gpio = GPIO
+        self.gpio = self._gpio_backend
         setattr(self.gpio, "init", False)
         setattr(self.gpio, "map", dict())
         setattr(self.gpio, "pins", dict())
@@ -54,7 +61,7 @@ class RPi(Booth):
 
         self._configure_pins()
 
-        mode = GPIO.BCM
+        mode = self.gpio.BCM
         self.gpio.setmode(mode)
 
         for use in self.gpio.map.values():
@@ -64,9 +71,9 @@ class RPi(Booth):
                 state = values['init_state']
 
                 if io == "in":
-                    m = GPIO.IN
+                    m = self.gpio.IN
                 elif io == "out":
-                    m = GPIO.OUT
+                    m = self.gpio.OUT
                 else:
                     msg = f"Incorrect value for IO mode for {label} on pin: {pin}. "\
                           "Expecting one of ['in', 'out']"
@@ -75,10 +82,17 @@ class RPi(Booth):
 
                 self.gpio.setup(pin, m)
 
-                if m == GPIO.OUT:
+                if m == self.gpio.OUT:
                     # Set default state for outputs
                     self.gpio.output(pin, state)
 
+        # Buttons report edges as events, instead of being polled
+        if getattr(self, "buttons", None):
+            self.buttons.close()
+        self.buttons = ButtonEvents(self.gpio, debounce=self.debounce)
+        for label, values in self.gpio.map['sw'].items():
+            self.buttons.add(label, values['pin'])
+
         self.gpio.init = True
         self.logger.info('Init Complete')
 
@@ -100,7 +114,7 @@ class RPi(Booth):
             self.gpio.pins[label] = pin
 
         # Override defaults from input
-        for k, v in self.kwargs.items():
+        for k, v in list(self.kwargs.items()):
             for label, use, pin, io, init_state in DEFAULT_PIN_MAP:
                 if k == label:
                     self.gpio.map[use][label]["pin"] = int(v)
@@ -130,13 +144,12 @@ class RPi(Booth):
         if not label:
             self.except_and_log(ex_msg="'label' is a required argument for _get_pin_by_label()")
 
-        # Should only return 0 or 1 list items since label/k is unique
-        pin = [v for k, v in self.gpio.pins.items() if label == k]
-        if not pin:
+        pin = self.gpio.pins.get(label)
+        if pin is None:
             self.except_and_log(
                 ex_msg=f"Unable to find a pin for {label} in gpio.pins: {self.gpio.pins}")
             return None
-        return pin[0]
+        return pin
 
     def _check_pin_use(self, label: str = "", pin: int = 0, pintype: str = "led") -> bool:
         """ Check that the label or pin is the correct type (use) and return True/False
@@ -208,8 +221,27 @@ class RPi(Booth):
         else:
             return False
 
+    def wait_for_button(self, timeout: float = None, labels: list = None,
+                        pressed: bool = True) -> dict:
+        """ Block until a button is pressed (or released, pressed=False), returns the event
+            {"label", "pin", "pressed", "time"}, or None on timeout.
+            Presses of buttons not in labels are dropped.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            event = self.buttons.get(timeout=remaining, pressed=pressed)
+            if event is None or not labels or event["label"] in labels:
+                return event
+
+    def button_events(self):
+        """ Button events as an async iterator, see gpio.ButtonEvents.stream()
+        """
+        return self.buttons.stream()
+
     def check_sw_input(self, label: str = "", pin: int = 0) -> bool:
         """ Checks the status of a button or switch, returns True/False accordingly
+            Prefer wait_for_button(), polling this adds latency and can miss short presses.
         """
         if self._check_pin_use(label=label, pin=pin, pintype="sw"):
             if label:
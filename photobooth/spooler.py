@@ -0,0 +1,432 @@
+"""
+Print spooler, a persistent queue of print jobs written to the printer from a background thread
+
+Receipt printers are slow, so printing inline blocks whatever asked for the print.
+submit() records the job and returns its id straight away, and the writer thread
+(the only user of the printer's USB handle) works through the queue in order.
+
+A job is a list of Printer method calls:
+    spooler = PrintSpooler(printer)
+    job = spooler.submit([("image", [shot]), ("ln",), ("qr", [], {"content": url}), ("cut",)],
+                         key=shot)
+    spooler.status(job)  # queued, printing, done or failed
+
+Jobs with the same key are coalesced: submitting a key that is still queued, or that
+finished printing less than coalesce_window seconds ago, returns the existing job.
+
+PrinterPool spreads jobs across several printers (one spooler each), by queue depth
+and measured print time, and takes printers out of rotation while they are failing.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_SPOOL_DB = "~/.cache/photobooth/spool.sqlite3"
+
+# Seconds a finished job still absorbs duplicates (repeat presses of the print button)
+DEFAULT_COALESCE_WINDOW = 3.0
+
+# Seconds between checks for jobs submitted by other processes
+POLL_INTERVAL = 1.0
+
+# Seconds between checks of printers that are out of rotation
+HEALTH_CHECK_INTERVAL = 5.0
+
+# Estimated seconds per job, until a printer has printed one
+DEFAULT_JOB_SECONDS = 5.0
+
+# Weight of the latest job in a printer's moving average of seconds per job
+JOB_SECONDS_WEIGHT = 0.3
+
+# Errors that mean the printer (not the job) is the problem: USB timeouts, unplugged, no paper
+PRINTER_ERRORS = ["USBError", "USBTimeoutError", "timed out", "Timeout", "No such device",
+                  "Resource busy", "Pipe error", "Entity not found", "paper"]
+
+JOB_STATES = ["queued", "printing", "done", "failed"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    printer TEXT NOT NULL,
+    key TEXT,
+    ops TEXT NOT NULL,  -- JSON [[method, args, kwargs]]
+    state TEXT NOT NULL DEFAULT 'queued',
+    error TEXT,
+    submitted_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (printer, state, id);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (printer, key, id);
+"""
+
+
+def is_printer_error(err) -> bool:
+    """ True if an exception (or its message) means the printer itself is unavailable
+    """
+    text = f"{type(err).__name__}: {err}" if isinstance(err, BaseException) else str(err)
+    return any(e.lower() in text.lower() for e in PRINTER_ERRORS)
+
+
+def normalize_ops(ops: list) -> list:
+    """ [(method,), (method, args), (method, args, kwargs)] to [[method, args, kwargs]]
+    """
+    normalized = list()
+    for op in ops:
+        if isinstance(op, str):
+            op = (op,)
+        method, args, kwargs = (list(op) + [[], {}])[:3]
+        normalized.append([method, list(args), dict(kwargs)])
+    return normalized
+
+
+class PrintSpooler():
+    """ Queues print jobs in SQLite and writes them to one Printer from a background thread
+        Jobs are kept under the printer's name, so it needs one that is the same every run
+        (Printer(name=...)) for jobs queued before a restart to be printed after it.
+    """
+    def __init__(self, printer, db_path: str = DEFAULT_SPOOL_DB,
+                 coalesce_window: float = DEFAULT_COALESCE_WINDOW, start: bool = True,
+                 on_done=None, on_error=None):
+        """ on_done(spooler, job_id, seconds) is called from the writer thread after each job
+            on_error(spooler, job_id, err) is called when a job raises, before it is marked
+              failed. If it returns the name of a printer, the job is queued on it instead.
+        """
+        if printer.name == f"printer-{id(printer)}":
+            raise ValueError(f"The printer: {printer.name} needs a name to be spooled, its "
+                             "default name changes every run, which would strand its queued jobs. "
+                             "Please use Printer(name=...) or Booth().add_printer()")
+        self.printer = printer
+        self.db_path = os.path.expanduser(db_path)
+        self.coalesce_window = coalesce_window
+        self.on_done = on_done
+        self.on_error = on_error
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._paused = threading.Event()
+        self.thread = None
+        self.pid = None  # The process running the writer thread
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+        if start:
+            self.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        """ This thread's connection, sqlite connections can't be shared across threads or forks
+        """
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.row_factory = sqlite3.Row
+            # WAL commits don't wait on an fsync, so submit() stays fast
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def start(self):
+        """ Start the writer thread
+            Jobs left 'printing' by a crash are queued again, a reprint beats a lost receipt.
+        """
+        if self.is_alive():
+            return True
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET state = 'queued' WHERE printer = ? AND state = 'printing'",
+                       (self.printer.name,))
+        self._stop.clear()
+        self.thread = threading.Thread(target=self._run, name=f"spooler-{self.printer.name}",
+                                       daemon=True)
+        self.pid = os.getpid()
+        self.thread.start()
+        return True
+
+    def is_alive(self):
+        return self.thread is not None and self.pid == os.getpid() and self.thread.is_alive()
+
+    def pause(self):
+        """ Stop taking new jobs (after the one printing), they stay queued
+        """
+        self._paused.set()
+        return True
+
+    def resume(self):
+        self._paused.clear()
+        self._wake.set()
+        return True
+
+    def is_paused(self):
+        return self._paused.is_set()
+
+    def find(self, key: str) -> int:
+        """ The id of a job with key that new submissions would coalesce into, or None
+        """
+        row = self._connect().execute(
+            "SELECT id FROM jobs WHERE printer = ? AND key = ? AND "
+            "(state IN ('queued', 'printing') OR (state = 'done' AND finished_at >= ?)) "
+            "ORDER BY id DESC LIMIT 1",
+            (self.printer.name, key, time.time() - self.coalesce_window)).fetchone()
+        return row["id"] if row else None
+
+    def pending(self) -> int:
+        """ Jobs queued or printing on this printer
+        """
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM jobs WHERE printer = ? AND state IN ('queued', 'printing')",
+            (self.printer.name,)).fetchone()[0]
+
+    def move(self, printer_name: str, job_id: int = None) -> int:
+        """ Queue this printer's queued jobs (or one job) on another printer, returns the count
+        """
+        with self._connect() as db:
+            if job_id is None:
+                return db.execute("UPDATE jobs SET printer = ? WHERE printer = ? AND "
+                                  "state = 'queued'", (printer_name, self.printer.name)).rowcount
+            return db.execute("UPDATE jobs SET printer = ?, state = 'queued', error = NULL "
+                              "WHERE id = ?", (printer_name, job_id)).rowcount
+
+    def submit(self, ops: list, key: str = None) -> int:
+        """ Queue a job (a list of Printer method calls), returns the job id
+            If key matches a job that is queued, or done within coalesce_window, that job's
+            id is returned instead of queueing a duplicate.
+        """
+        ops = json.dumps(normalize_ops(ops))
+        if key is not None:
+            existing = self.find(key)
+            if existing:
+                return existing
+        db = self._connect()
+        with db:
+            job_id = db.execute(
+                "INSERT INTO jobs (printer, key, ops, submitted_at) VALUES (?, ?, ?, ?)",
+                (self.printer.name, key, ops, time.time())).lastrowid
+        self._wake.set()
+        return job_id
+
+    def _next_job(self):
+        """ Claim the oldest queued job, returns (id, ops) or None
+        """
+        db = self._connect()
+        with db:
+            row = db.execute("SELECT id, ops FROM jobs WHERE printer = ? AND state = 'queued' "
+                             "ORDER BY id LIMIT 1", (self.printer.name,)).fetchone()
+            if row is None:
+                return None
+            # Only claim it if another process's spooler hasn't
+            claimed = db.execute("UPDATE jobs SET state = 'printing' "
+                                 "WHERE id = ? AND state = 'queued'", (row["id"],)).rowcount
+        if not claimed:
+            return self._next_job()
+        return row["id"], json.loads(row["ops"])
+
+    def _run(self):
+        db = self._connect()
+        while not self._stop.is_set():
+            job = None if self._paused.is_set() else self._next_job()
+            if job is None:
+                self._wake.wait(timeout=POLL_INTERVAL)
+                self._wake.clear()
+                continue
+
+            job_id, ops = job
+            state, error = "done", None
+            began = time.monotonic()
+            try:
+                for method, args, kwargs in ops:
+                    getattr(self.printer, method)(*args, **kwargs)
+            except Exception as err:
+                state, error = "failed", f"{type(err).__name__}: {err}"
+                moved_to = self.on_error(self, job_id, err) if self.on_error else None
+                if moved_to:
+                    self.move(moved_to, job_id=job_id)
+                    continue
+            with db:
+                db.execute("UPDATE jobs SET state = ?, error = ?, finished_at = ? WHERE id = ?",
+                           (state, error, time.time(), job_id))
+            if state == "done" and self.on_done:
+                self.on_done(self, job_id, time.monotonic() - began)
+
+    def job(self, job_id: int) -> dict:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["ops"] = json.loads(job["ops"])
+        return job
+
+    def status(self, job_id: int) -> str:
+        row = self._connect().execute("SELECT state FROM jobs WHERE id = ?",
+                                      (job_id,)).fetchone()
+        return row["state"] if row else None
+
+    def jobs(self, state: str = None, limit: int = 100) -> list:
+        """ This printer's latest jobs, newest first, optionally only those in state
+        """
+        if state and state not in JOB_STATES:
+            raise ValueError(f"The job state: {state} is not supported. "
+                             f"Please use one of {JOB_STATES}")
+        query = "SELECT id FROM jobs WHERE printer = ?"
+        args = [self.printer.name]
+        if state:
+            query += " AND state = ?"
+            args.append(state)
+        rows = self._connect().execute(f"{query} ORDER BY id DESC LIMIT ?", args + [limit])
+        return [self.job(row["id"]) for row in rows.fetchall()]
+
+    def wait(self, job_id: int, timeout: float = None, interval: float = 0.05) -> str:
+        """ Wait for a job to be done or failed, returns its state (still queued/printing on
+            timeout)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            state = self.status(job_id)
+            if state not in ("queued", "printing"):
+                return state
+            if deadline is not None and time.monotonic() >= deadline:
+                return state
+            time.sleep(interval)
+
+    def stop(self, timeout: float = None):
+        """ Stop the writer thread after the job it is printing, queued jobs stay queued
+        """
+        self._stop.set()
+        self._wake.set()
+        if self.is_alive():
+            self.thread.join(timeout=timeout)
+        return True
+
+
+class PrinterPool():
+    """ Spreads print jobs across several printers, each with its own PrintSpooler
+        A job goes to the healthy printer expected to finish it first, from its queue depth
+        and measured seconds per job. A printer that fails with a USB timeout or paper out
+        is taken out of rotation: its jobs move to other printers, and it is checked every
+        check_interval seconds (Printer.check()) until it recovers.
+    """
+    def __init__(self, printers: list, db_path: str = DEFAULT_SPOOL_DB,
+                 coalesce_window: float = DEFAULT_COALESCE_WINDOW,
+                 check_interval: float = HEALTH_CHECK_INTERVAL):
+        if not printers:
+            raise ValueError("A PrinterPool needs at least one printer")
+        names = [printer.name for printer in printers]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Printer names must be unique in a pool. Received: {names}")
+
+        self.spoolers = {printer.name: PrintSpooler(printer, db_path=db_path,
+                                                    coalesce_window=coalesce_window,
+                                                    on_done=self._done, on_error=self._error)
+                         for printer in printers}
+        self.job_seconds = {name: DEFAULT_JOB_SECONDS for name in names}
+        self._measured = set()  # Printers whose job_seconds come from a print
+        self.unhealthy = dict()  # name: reason
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._check_health, name="printer-pool-health",
+                                       daemon=True)
+        self.thread.start()
+
+    def _pick(self, exclude: str = None) -> str:
+        """ The printer expected to finish a new job first, unhealthy printers only if
+            there's nothing else
+        """
+        names = [name for name in self.spoolers if name != exclude]
+        healthy = [name for name in names if name not in self.unhealthy]
+        candidates = healthy or names or [exclude]
+        return min(candidates, key=lambda name: (
+            (self.spoolers[name].pending() + 1) * self.job_seconds[name], name))
+
+    def submit(self, ops: list, key: str = None) -> int:
+        """ Queue a job on the best printer, returns the job id
+            A key already queued (or just printed) on any printer in the pool is coalesced.
+        """
+        if key is not None:
+            for spooler in self.spoolers.values():
+                existing = spooler.find(key)
+                if existing:
+                    return existing
+        return self.spoolers[self._pick()].submit(ops, key=key)
+
+    def _done(self, spooler, job_id, seconds):
+        # Moving average of the printer's seconds per job, the first print replaces the guess
+        name = spooler.printer.name
+        if name not in self._measured:
+            self._measured.add(name)
+            self.job_seconds[name] = seconds
+        else:
+            self.job_seconds[name] += JOB_SECONDS_WEIGHT * (seconds - self.job_seconds[name])
+
+    def _error(self, spooler, job_id, err):
+        """ Printer errors take the printer out of rotation and move its jobs (with only one
+            printer, they wait for it to recover), job errors fail the job
+        """
+        if not is_printer_error(err):
+            return None
+        name = spooler.printer.name
+        self.take_out(name, reason=f"{type(err).__name__}: {err}")
+        return self._pick(exclude=name)
+
+    def take_out(self, name: str, reason: str = "manual"):
+        """ Take a printer out of rotation and move its queued jobs to the others
+        """
+        with self._lock:
+            self.unhealthy[name] = reason
+            self.spoolers[name].pause()
+        self._move_jobs(name)
+        return True
+
+    def _move_jobs(self, name: str) -> int:
+        """ Move a printer's queued jobs to the best other printer
+        """
+        target = self._pick(exclude=name)
+        if target == name:
+            return 0
+        moved = self.spoolers[name].move(target)
+        if moved:
+            self.spoolers[target]._wake.set()
+        return moved
+
+    def put_back(self, name: str):
+        with self._lock:
+            self.unhealthy.pop(name, None)
+            self.spoolers[name].resume()
+        return True
+
+    def _check_health(self):
+        while not self._stop.wait(self.check_interval):
+            for name in list(self.unhealthy):
+                check = getattr(self.spoolers[name].printer, "check", None)
+                if check is None or check():
+                    self.put_back(name)
+                else:
+                    # Jobs submitted while it was being taken out, or by another process
+                    self._move_jobs(name)
+
+    def health(self) -> dict:
+        """ {printer name: {"healthy", "reason", "pending", "job_seconds"}}
+        """
+        return {name: {"healthy": name not in self.unhealthy,
+                       "reason": self.unhealthy.get(name),
+                       "pending": spooler.pending(),
+                       "job_seconds": self.job_seconds[name]}
+                for name, spooler in self.spoolers.items()}
+
+    # Every spooler shares the jobs table, any of them can look a job up
+    def job(self, job_id: int) -> dict:
+        return next(iter(self.spoolers.values())).job(job_id)
+
+    def status(self, job_id: int) -> str:
+        return next(iter(self.spoolers.values())).status(job_id)
+
+    def wait(self, job_id: int, timeout: float = None) -> str:
+        return next(iter(self.spoolers.values())).wait(job_id, timeout=timeout)
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        for spooler in self.spoolers.values():
+            spooler.stop(timeout=timeout)
+        return True
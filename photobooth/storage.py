@@ -0,0 +1,329 @@
+"""
+Capture storage, a persistent index of every capture and disk space management
+
+Captures are recorded in a SQLite database in the capture dir, so the list of
+captures survives restarts and never needs a rescan of the directory. Recent
+captures are read from the end of the primary key index.
+
+When the disk fills past the high watermark, space is freed until it is under the
+low watermark: RAW files first (oldest first, moved to offload_dir if one is set),
+then derivatives (they can be made again). JPEGs are only removed if evict_jpegs.
+add() checks the watermarks in a background thread, so a slow or failing eviction never
+holds up (or fails) a capture. A file that can't be removed is logged and skipped.
+"""
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+DEFAULT_CAPTURE_DIR = "/opt/captures"
+CAPTURE_DB = "captures.sqlite3"
+
+# Fractions of the disk used
+DEFAULT_HIGH_WATERMARK = 0.90
+DEFAULT_LOW_WATERMARK = 0.80
+
+RAW_EXTENSIONS = [".cr2", ".cr3", ".crw", ".nef", ".nrw", ".arw", ".srf", ".raf",
+                  ".orf", ".rw2", ".pef", ".dng"]
+
+# Rows fetched at a time while evicting
+EVICT_BATCH = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    camera TEXT,
+    session TEXT,
+    taken_at REAL NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL DEFAULT 0,
+    raw_path TEXT,
+    raw_size INTEGER NOT NULL DEFAULT 0,
+    raw_state TEXT,  -- kept, offloaded, deleted (NULL if there wasn't one)
+    derivatives TEXT,  -- JSON {name: path}
+    state TEXT NOT NULL DEFAULT 'kept'  -- kept, deleted
+);
+CREATE INDEX IF NOT EXISTS captures_camera ON captures (camera, id);
+CREATE INDEX IF NOT EXISTS captures_session ON captures (session, id);
+CREATE INDEX IF NOT EXISTS captures_raw ON captures (raw_state, id);
+"""
+
+
+def raw_sibling(path: str) -> str:
+    """ The RAW file saved next to a JPEG (same name, RAW extension), or None
+    """
+    stem = os.path.splitext(path)[0]
+    for ext in RAW_EXTENSIONS:
+        for candidate in (f"{stem}{ext}", f"{stem}{ext.upper()}"):
+            if os.path.exists(candidate):
+                return candidate
+    return None
+
+
+def file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class CaptureStore():
+    """ SQLite index of captures in a capture dir, with disk watermarks
+        Safe to use from several threads and processes, each gets its own connection.
+    """
+    def __init__(self, root: str = DEFAULT_CAPTURE_DIR, db_path: str = None,
+                 high_watermark: float = DEFAULT_HIGH_WATERMARK,
+                 low_watermark: float = DEFAULT_LOW_WATERMARK,
+                 offload_dir: str = None, evict_jpegs: bool = False):
+        if not 0 < low_watermark < high_watermark <= 1:
+            raise ValueError("Watermarks must be 0 < low_watermark < high_watermark <= 1. "
+                             f"Received: low={low_watermark}, high={high_watermark}")
+        self.root = os.path.expanduser(root)
+        self.db_path = os.path.expanduser(db_path) if db_path else \
+            os.path.join(self.root, CAPTURE_DB)
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.offload_dir = os.path.expanduser(offload_dir) if offload_dir else None
+        self.evict_jpegs = evict_jpegs
+        self._local = threading.local()
+        self._enforcer = (None, None)  # (pid, Thread) of the background watermark check
+
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """ This thread's connection, sqlite connections can't be shared across threads or forks
+        """
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.row_factory = sqlite3.Row
+            # WAL lets readers (the web server) work while a capture is being written
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> dict:
+        if row is None:
+            return None
+        capture = dict(row)
+        capture["derivatives"] = json.loads(capture["derivatives"] or "{}")
+        return capture
+
+    def add(self, path: str, camera: str = None, session: str = None,
+            taken_at: float = None) -> int:
+        """ Record a capture (and the RAW saved next to it), returns its id
+            Checks the watermarks afterwards, in the background.
+        """
+        raw = raw_sibling(path)
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT OR REPLACE INTO captures "
+                "(camera, session, taken_at, path, size, raw_path, raw_size, raw_state) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (camera, session, taken_at or time.time(), path, file_size(path),
+                 raw, file_size(raw) if raw else 0, "kept" if raw else None))
+            capture_id = cursor.lastrowid
+        self.enforce_in_background()
+        return capture_id
+
+    def enforce_in_background(self) -> threading.Thread:
+        """ enforce_watermarks() in a thread, unless one is already running (in this process)
+        """
+        pid, thread = self._enforcer
+        if pid == os.getpid() and thread.is_alive():
+            return thread
+        thread = threading.Thread(target=self._enforce, name="capture-store-watermarks",
+                                  daemon=True)
+        self._enforcer = (os.getpid(), thread)
+        thread.start()
+        return thread
+
+    def _enforce(self):
+        try:
+            self.enforce_watermarks()
+        except Exception:
+            logging.exception(f"Checking the watermarks of {self.root} failed")
+        finally:
+            db = getattr(self._local, "db", None)  # This thread's, the others' stay open
+            if db is not None:
+                db.close()
+                self._local.db = None
+
+    def add_derivatives(self, path: str, derivatives: dict) -> bool:
+        """ Record the derivatives ({name: path}) made of a capture
+        """
+        with self._connect() as db:
+            cursor = db.execute("UPDATE captures SET derivatives = ? WHERE path = ?",
+                                (json.dumps(derivatives), path))
+        return cursor.rowcount > 0
+
+    def get(self, path: str) -> dict:
+        row = self._connect().execute("SELECT * FROM captures WHERE path = ?",
+                                      (path,)).fetchone()
+        return self._row(row)
+
+    def recent(self, count: int = 10, camera: str = None, session: str = None) -> list:
+        """ The latest count captures, newest first
+        """
+        where, args = ["state = 'kept'"], list()
+        if camera:
+            where.append("camera = ?")
+            args.append(camera)
+        if session:
+            where.append("session = ?")
+            args.append(session)
+        rows = self._connect().execute(
+            f"SELECT * FROM captures WHERE {' AND '.join(where)} ORDER BY id DESC LIMIT ?",
+            args + [count]).fetchall()
+        return [self._row(row) for row in rows]
+
+    def last(self, camera: str = None) -> dict:
+        captures = self.recent(1, camera=camera)
+        return captures[0] if captures else None
+
+    def paths(self, camera: str = None) -> list:
+        """ Every kept capture path, oldest first
+        """
+        if camera:
+            rows = self._connect().execute(
+                "SELECT path FROM captures WHERE state = 'kept' AND camera = ? ORDER BY id",
+                (camera,))
+        else:
+            rows = self._connect().execute(
+                "SELECT path FROM captures WHERE state = 'kept' ORDER BY id")
+        return [row["path"] for row in rows]
+
+    def count(self, camera: str = None) -> int:
+        if camera:
+            row = self._connect().execute(
+                "SELECT COUNT(*) FROM captures WHERE state = 'kept' AND camera = ?",
+                (camera,)).fetchone()
+        else:
+            row = self._connect().execute(
+                "SELECT COUNT(*) FROM captures WHERE state = 'kept'").fetchone()
+        return row[0]
+
+    def disk_used(self) -> float:
+        """ Fraction of the capture dir's disk that is used
+        """
+        usage = shutil.disk_usage(self.root)
+        return usage.used / usage.total
+
+    def enforce_watermarks(self) -> list:
+        """ If the disk is over the high watermark, free space until it is under the low one
+            Returns the files that were removed or offloaded
+        """
+        if self.disk_used() < self.high_watermark:
+            return list()
+
+        freed = self._evict_raws()
+        if self.disk_used() >= self.low_watermark:
+            freed += self._evict_derivatives()
+        if self.disk_used() >= self.low_watermark and self.evict_jpegs:
+            freed += self._evict_jpegs()
+        return freed
+
+    def _evict_raws(self) -> list:
+        freed = list()
+        db = self._connect()
+        last_id = 0  # Files that couldn't be removed are left for the next check
+        while self.disk_used() >= self.low_watermark:
+            rows = db.execute("SELECT id, raw_path FROM captures WHERE raw_state = 'kept' "
+                              "AND id > ? ORDER BY id LIMIT ?",
+                              (last_id, EVICT_BATCH)).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                last_id = row["id"]
+                state = "deleted"
+                try:
+                    if self.offload_dir:
+                        os.makedirs(self.offload_dir, exist_ok=True)
+                        shutil.move(row["raw_path"], os.path.join(
+                            self.offload_dir, os.path.basename(row["raw_path"])))
+                        state = "offloaded"
+                    else:
+                        os.remove(row["raw_path"])
+                except FileNotFoundError:
+                    pass  # Already gone
+                except OSError as err:
+                    logging.warning(f"Couldn't free {row['raw_path']}: {err}")
+                    continue
+                with db:
+                    db.execute("UPDATE captures SET raw_state = ? WHERE id = ?",
+                               (state, row["id"]))
+                freed.append(row["raw_path"])
+                if self.disk_used() < self.low_watermark:
+                    break
+        return freed
+
+    def _evict_derivatives(self) -> list:
+        freed = list()
+        db = self._connect()
+        last_id = 0
+        while self.disk_used() >= self.low_watermark:
+            rows = db.execute("SELECT id, derivatives FROM captures "
+                              "WHERE derivatives IS NOT NULL AND id > ? ORDER BY id LIMIT ?",
+                              (last_id, EVICT_BATCH)).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                last_id = row["id"]
+                kept = dict()
+                for name, path in json.loads(row["derivatives"]).items():
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as err:
+                        logging.warning(f"Couldn't free {path}: {err}")
+                        kept[name] = path
+                        continue
+                    freed.append(path)
+                with db:
+                    db.execute("UPDATE captures SET derivatives = ? WHERE id = ?",
+                               (json.dumps(kept) if kept else None, row["id"]))
+                if self.disk_used() < self.low_watermark:
+                    break
+        return freed
+
+    def _evict_jpegs(self) -> list:
+        freed = list()
+        db = self._connect()
+        last_id = 0
+        while self.disk_used() >= self.low_watermark:
+            rows = db.execute("SELECT id, path FROM captures WHERE state = 'kept' "
+                              "AND id > ? ORDER BY id LIMIT ?",
+                              (last_id, EVICT_BATCH)).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                last_id = row["id"]
+                try:
+                    os.remove(row["path"])
+                except FileNotFoundError:
+                    pass
+                except OSError as err:
+                    logging.warning(f"Couldn't free {row['path']}: {err}")
+                    continue
+                with db:
+                    db.execute("UPDATE captures SET state = 'deleted' WHERE id = ?",
+                               (row["id"],))
+                freed.append(row["path"])
+                if self.disk_used() < self.low_watermark:
+                    break
+        return freed
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None and self._local.pid == os.getpid():
+            db.close()
+        self._local = threading.local()
+        return True
@@ -6,7 +6,8 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path('', views.index, name='index'),
-    path('last/', views.last, name='last')
+    path('last/', views.last, name='last'),
+    path('last/version/', views.last_version, name='last_version')
 ]
 
 if settings.DEBUG:
@@ -1,5 +1,11 @@
+import os
+
+from django.http import JsonResponse
 from django.shortcuts import render
 
+# Written by Booth().preview_last_shot(), see photobooth/preview.py
+LAST_SHOT = os.path.join(os.path.dirname(__file__), "static", "img", "last.jpg")
+
 
 # Create your views here.
 def index(request):
@@ -9,3 +15,13 @@ def index(request):
 
 def last(request):
     return render(request, 'last.html')
+
+
+def last_version(request):
+    """ Changes whenever last.jpg is replaced, so last.html only reloads the image then
+    """
+    try:
+        version = os.stat(LAST_SHOT).st_mtime_ns
+    except OSError:
+        version = None
+    return JsonResponse({"version": version})
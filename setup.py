@@ -24,8 +24,10 @@ setuptools.setup(
     install_requires=[
         "RPi.GPIO>=0.7.0",
         "Adafruit-Blinka>=6.5.0",
+        "numpy>=1.16.2",
         "adafruit-circuitpython-neopixel>=6.0.3",
         "python-escpos==2.2.0",
+        "qrcode>=6.1",
         "django>=3.2.3"
     ]
 )
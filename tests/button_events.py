@@ -0,0 +1,61 @@
+"""
+Debounced button events from a SimulatedGPIO, no Raspberry Pi needed
+    python3 tests/button_events.py
+"""
+import asyncio
+import time
+
+from photobooth.gpio import ButtonEvents, SimulatedGPIO
+
+CAPTURE = 25
+PRINT = 23
+
+gpio = SimulatedGPIO()
+gpio.setmode(gpio.BCM)
+for pin in (CAPTURE, PRINT):
+    gpio.setup(pin, gpio.IN)
+
+buttons = ButtonEvents(gpio, debounce=0.02)
+buttons.add("capture", CAPTURE)
+buttons.add("print", PRINT)
+
+# A bouncing press is one press and one release
+start = time.monotonic()
+gpio.press(CAPTURE, duration=0.05, bounces=5)
+press = buttons.get(timeout=1)
+release = buttons.get(timeout=1)
+assert press["label"] == "capture" and press["pressed"], press
+assert release["label"] == "capture" and not release["pressed"], release
+assert buttons.get(timeout=0.1) is None, "Bounce leaked through as extra events"
+print(f"Bouncing press: seen after {(press['time'] - start) * 1000:.2f}ms, held "
+      f"{(release['time'] - press['time']) * 1000:.1f}ms")
+
+# A press shorter than the debounce still comes out as a press and a release
+gpio.press(PRINT, duration=0.005)
+press = buttons.get(timeout=1)
+release = buttons.get(timeout=1)
+assert press["label"] == "print" and press["pressed"] and not release["pressed"]
+print(f"5ms press: release reported {(release['time'] - press['time']) * 1000:.1f}ms later")
+
+# Only presses
+gpio.press(CAPTURE, duration=0.03)
+gpio.press(PRINT, duration=0.03)
+labels = [buttons.get(timeout=1, pressed=True)["label"] for _ in range(2)]
+assert labels == ["capture", "print"], labels
+print(f"Presses in order: {labels}")
+
+
+async def stream():
+    events = buttons.stream()
+    first = asyncio.ensure_future(events.__anext__())
+    await asyncio.sleep(0)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, gpio.press, CAPTURE, 0.03)
+    return await asyncio.wait_for(first, timeout=1)
+
+event = asyncio.run(stream())
+assert event["label"] == "capture" and event["pressed"], event
+print(f"asyncio stream: {event['label']} pressed={event['pressed']}")
+
+buttons.close()
+print("OK")
@@ -0,0 +1,38 @@
+"""
+Fires several cameras at once with CameraGroup, against tests/fake_gphoto2.py on 3 ports
+    python3 tests/camera_group.py
+"""
+import os
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+os.environ.setdefault("PHOTOBOOTH_GPHOTO2", os.path.join(HERE, "fake_gphoto2.py"))
+os.environ.setdefault("FAKE_GPHOTO2_CAMERAS", "Canon EOS 1100D=usb:001,004;"
+                                              "Canon EOS 1100D=usb:001,005;"
+                                              "Canon EOS 1100D=usb:002,003")
+os.environ.setdefault("FAKE_GPHOTO2_DELAY", "0.2")
+os.environ.setdefault("FAKE_GPHOTO2_DOWNLOAD", "0.4")
+
+from photobooth.camera import CameraGroup  # noqa: E402
+
+output_dir = tempfile.mkdtemp(prefix="camera_group_")
+group = CameraGroup.detect("Canon EOS 1100D", output_dir=output_dir)
+print(f"Cameras: {[camera.addr for camera in group.cameras]}")
+
+for _ in range(3):
+    start = time.monotonic()
+    shot = group.capture()
+    print(f"Group capture took {time.monotonic() - start:.3f}s, skew {shot['skew'] * 1000:.2f}ms")
+    for camera in shot["cameras"]:
+        print(f"  {camera['port']}: trigger {camera['trigger']:.3f}s, "
+              f"download {camera['download']:.3f}s -> {camera['file']}")
+        assert os.path.exists(camera["file"])
+
+start = time.monotonic()
+for camera in group.cameras:
+    camera.capture()
+print(f"One at a time took {time.monotonic() - start:.3f}s")
+
+group.close()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+A stand-in for the gphoto2 CLI, for exercising photobooth.camera without a camera.
+
+    export PHOTOBOOTH_GPHOTO2=/path/to/tests/fake_gphoto2.py
+    python3 -c "from photobooth.camera import Camera; print(Camera('1100D', '/tmp/c').capture())"
+
+Captures are 3000x2000 JPEGs with an EXIF thumbnail (and a fake RAW).
+
+Supports --version, --list-cameras, --auto-detect, --set-config,
+--capture-image-and-download and --shell (capture-image-and-download, capture-image, get,
+get-thumbnail, set-config, lcd, exit)
+
+Environment:
+    FAKE_GPHOTO2_CAMERAS   - "model=port;model=port" of connected cameras.
+                             Default: "Canon EOS 1100D=usb:001,004"
+    FAKE_GPHOTO2_DELAY     - seconds each capture takes. Default: 0.1
+    FAKE_GPHOTO2_DOWNLOAD  - seconds each file download takes. Default: 0.2
+    FAKE_GPHOTO2_USB_ERROR - in --shell, fail with an I/O error on this capture number (1 based)
+"""
+import os
+import sys
+import time
+
+SUPPORTED = ["Canon EOS 1100D", "Canon EOS 1200D", "Canon EOS 800D",
+             "Nikon DSC D750", "Sony Alpha-A7 III"]
+
+CAMERAS = [c.split("=", 1) for c in
+           os.environ.get("FAKE_GPHOTO2_CAMERAS", "Canon EOS 1100D=usb:001,004").split(";") if c]
+DELAY = float(os.environ.get("FAKE_GPHOTO2_DELAY", 0.1))
+DOWNLOAD = float(os.environ.get("FAKE_GPHOTO2_DOWNLOAD", 0.2))
+USB_ERROR = int(os.environ.get("FAKE_GPHOTO2_USB_ERROR", 0))
+
+
+def arg(name, default=None):
+    if name in sys.argv:
+        return sys.argv[sys.argv.index(name) + 1]
+    return default
+
+
+def thumbnail_jpeg(image=None):
+    """ The 160x120 JPEG a camera embeds in its captures (and serves to get-thumbnail)
+    """
+    import io
+    from PIL import Image
+    image = image or Image.new("RGB", (3000, 2000), (128, 64, 32))
+    thumb = io.BytesIO()
+    image.resize((160, 120)).save(thumb, "JPEG")
+    return thumb.getvalue()
+
+
+def exif_with_thumbnail(image):
+    """ A minimal EXIF block with IFD1 pointing at an embedded JPEG thumbnail, like a DSLR
+    """
+    import struct
+    thumb = thumbnail_jpeg(image)
+    # TIFF header, empty IFD0 -> IFD1 with the thumbnail offset and length
+    ifd1 = 8 + 6
+    data = ifd1 + 2 + (2 * 12) + 4
+    tiff = b"II*\x00" + struct.pack("<I", 8)
+    tiff += struct.pack("<HI", 0, ifd1)
+    tiff += struct.pack("<H", 2)
+    tiff += struct.pack("<HHII", 0x0201, 4, 1, data)
+    tiff += struct.pack("<HHII", 0x0202, 4, 1, len(thumb))
+    tiff += struct.pack("<I", 0)
+    return b"Exif\x00\x00" + tiff + thumb
+
+
+def write_jpeg(path):
+    try:
+        from PIL import Image
+        image = Image.new("RGB", (3000, 2000), (128, 64, 32))
+        image.save(path, "JPEG", exif=exif_with_thumbnail(image))
+    except ImportError:
+        with open(path, "wb") as fh:
+            fh.write(b"\xff\xd8\xff\xe0fake jpeg\xff\xd9")
+
+
+def capture(directory, stem):
+    time.sleep(DELAY + DOWNLOAD)
+    jpg = os.path.join(directory, f"{stem}.jpg")
+    write_jpeg(jpg)
+    with open(os.path.join(directory, f"{stem}.cr2"), "wb") as fh:
+        fh.write(b"fake raw")
+    return [f"{stem}.jpg", f"{stem}.cr2"]
+
+
+def shell():
+    port = arg("--port", "")
+    if CAMERAS and port not in [p for m, p in CAMERAS]:
+        print(f"*** Error: No camera found on port '{port}' ***", flush=True)
+        return 1
+
+    shots = 0
+    card = dict()  # Files left on the camera by capture-image
+
+    def prompt():
+        sys.stdout.write(f"gphoto2: {{{os.getcwd()}}} /> ")
+        sys.stdout.flush()
+
+    prompt()
+    for line in sys.stdin:
+        cmd, _, value = line.strip().partition(" ")
+        if cmd in ("exit", "quit", "q"):
+            return 0
+        elif cmd == "lcd":
+            os.chdir(value.strip("'\""))
+        elif cmd == "capture-image-and-download":
+            shots += 1
+            if shots == USB_ERROR:
+                print("*** Error (-7: 'I/O problem') ***", flush=True)
+                return 1
+            for name in capture(os.getcwd(), f"capt{shots:04d}"):
+                print(f"New file is in location /store_00020001/DCIM/100CANON/{name} on the camera")
+                print(f"Saving file as {name}")
+                print(f"Deleting file /store_00020001/DCIM/100CANON/{name} on the camera")
+        elif cmd == "capture-image":
+            shots += 1
+            time.sleep(DELAY)
+            for ext in ("jpg", "cr2"):
+                path = f"/store_00020001/DCIM/100CANON/capt{shots:04d}.{ext}"
+                card[path] = ext
+                print(f"New file is in location {path} on the camera")
+        elif cmd == "get":
+            path = value.strip("'\"")
+            if path not in card:
+                print(f"*** Error: File '{path}' not found ***")
+            else:
+                time.sleep(DOWNLOAD / 2)
+                name = os.path.basename(path)
+                if card[path] == "jpg":
+                    write_jpeg(name)
+                else:
+                    with open(name, "wb") as fh:
+                        fh.write(b"fake raw")
+                print(f"Saving file as {name}")
+        elif cmd == "get-thumbnail":
+            path = value.strip("'\"")
+            if card.get(path) != "jpg":
+                print(f"*** Error: File '{path}' not found ***")
+            else:
+                name = f"thumb_{os.path.basename(path)}"
+                with open(name, "wb") as fh:
+                    fh.write(thumbnail_jpeg())
+                print(f"Saving file as {name}")
+        elif cmd == "set-config":
+            pass
+        else:
+            print(f"*** Error: Unknown command '{cmd}' ***")
+        prompt()
+    return 0
+
+
+def main():
+    if "--version" in sys.argv:
+        print("gphoto2         2.5.27         fake\nlibgphoto2      2.5.22         fake")
+    elif "--list-cameras" in sys.argv:
+        print(f"Number of supported cameras: {len(SUPPORTED)}\nSupported cameras:", end="")
+        for model in SUPPORTED:
+            print(f'\n\t"{model}"', end="")
+        print()
+    elif "--auto-detect" in sys.argv:
+        print(f"{'Model':<31}Port\n" + "-" * 58)
+        for model, port in CAMERAS:
+            print(f"{model:<31}{port}")
+    elif "--shell" in sys.argv:
+        return shell()
+    elif "--capture-image-and-download" in sys.argv:
+        filename = arg("--filename")
+        capture(os.path.dirname(filename), os.path.splitext(os.path.basename(filename))[0])
+    elif "--set-config" in sys.argv:
+        pass
+    else:
+        print("Usage: see tests/fake_gphoto2.py", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""
+GlyphAtlas().compose() draws the same pixels as render_text() (PIL), for each bundled font
+    python3 tests/glyph_atlas.py
+"""
+import tempfile
+
+import numpy
+
+from photobooth.glyphs import ATLAS_CHARSET, DEFAULT_FONT_PT, get_atlas
+from photobooth.neopixel import render_text
+
+FONTS = ["Apple_II_mod", "4x7", "5x7"]
+ROWS = 8
+COLS = 32
+
+TEXTS = ["Press the capture button to begin!  ", "AWESOME!", "3...", "Say cheese :)",
+         ATLAS_CHARSET, "e", "]s{", "  "]
+
+atlas_dir = tempfile.mkdtemp(prefix="glyph_atlas_")
+for font in FONTS:
+    atlas = get_atlas(font, DEFAULT_FONT_PT, ROWS, atlas_dir=atlas_dir)
+    for text in TEXTS:
+        expected = numpy.asarray(render_text(text, ROWS, COLS, font_name=font)) == 255
+        composed = atlas.compose(text, pad=COLS)
+        assert composed.shape == expected.shape, \
+            f"{font} {text!r}: {composed.shape} != {expected.shape} (PIL)"
+        diff = numpy.argwhere(composed != expected)
+        assert not len(diff), f"{font} {text!r}: differs at (row, col) {diff[:5].tolist()}"
+    print(f"{font}: matches PIL, attract text is {atlas.width(TEXTS[0])}px wide")
+
+    # The atlas loaded back from the cache file is the same
+    get_atlas.cache_clear()
+    reloaded = get_atlas(font, DEFAULT_FONT_PT, ROWS, atlas_dir=atlas_dir)
+    built = get_atlas.__wrapped__(font, DEFAULT_FONT_PT, ROWS, atlas_dir=tempfile.mkdtemp())
+    assert numpy.array_equal(reloaded.compose(ATLAS_CHARSET), built.compose(ATLAS_CHARSET))
+
+print("OK")
@@ -0,0 +1,40 @@
+"""
+Worker().stop() ends a worker that is running a loop(), like the attract scroll
+    python3 tests/worker_stop.py
+"""
+import time
+
+from photobooth.booth import Worker
+
+
+class Ticker():
+    name = "ticker"
+
+    def tick(self, stop_event=None):
+        # One frame of an effect, like Neopixel().scroll()
+        time.sleep(0.01)
+        return True
+
+    def slow(self):
+        time.sleep(0.2)
+        return "done"
+
+
+worker = Worker(Ticker(), start=True)
+looping = worker.loop("tick")
+time.sleep(0.2)
+start = time.monotonic()
+assert worker.stop(timeout=2), "stop() didn't end a looping worker"
+assert looping.result(timeout=1) is True
+assert not worker.is_busy()
+print(f"Looping worker stopped in {(time.monotonic() - start) * 1000:.1f}ms")
+
+# Queued commands still finish before the worker ends
+worker = Worker(Ticker(), start=True)
+worker.loop("tick")
+queued = worker.send("slow")
+assert worker.stop(timeout=2), "stop() didn't end the worker"
+assert queued.result(timeout=1) == "done"
+print("Queued command finished before stopping")
+
+print("OK")